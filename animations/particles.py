@@ -0,0 +1,98 @@
+import cv2
+import numpy as np
+from functools import lru_cache
+from .trace import span
+
+# ==========================================================
+# ✨ Particle engine (structure of arrays)
+# ==========================================================
+# Every particle attribute is one NumPy array, so a frame costs a handful of
+# array ops no matter how many particles are alive:
+#   update() → move + age + cull in one batch
+#   spawn()  → append a batch drawn from a seeded RNG (same seed → same frames,
+#              so renders stay reproducible and cacheable)
+#   draw()   → one fancy-indexed write per distinct radius (pre-rasterized discs)
+# Speeds and lifetimes are in 1/24 s units and scaled by fps, so the motion is
+# the same at any output frame rate.
+
+
+@lru_cache(maxsize=None)
+def disc_offsets(radius):
+    """(dy, dx) offsets of the pixels cv2.circle fills for a disc of this radius."""
+    size = 2 * radius + 3
+    stamp = np.zeros((size, size), dtype=np.uint8)
+    cv2.circle(stamp, (radius + 1, radius + 1), radius, 255, -1)
+    dy, dx = np.nonzero(stamp)
+    return dy - (radius + 1), dx - (radius + 1)
+
+
+class ParticleSystem:
+    """
+    Falling sparkles on a width x height canvas.
+    radius / speed / lifetime are (low, high) spawn ranges; radius and lifetime
+    are inclusive integer ranges, speed is uniform (px per 1/24 s, downwards).
+    """
+
+    def __init__(self, width, height, fps=24, seed=0, radius=(1, 3), speed=(0.5, 2.0),
+                 lifetime=(20, 50), color=(200, 255, 255)):
+        self.width, self.height = width, height
+        self.step = 24 / fps
+        self.radius_range, self.speed_range, self.lifetime_range = radius, speed, lifetime
+        self.color = np.array(color, dtype=np.uint8)
+        self.rng = np.random.default_rng(seed)
+
+        self.x = np.empty(0, dtype=np.float32)
+        self.y = np.empty(0, dtype=np.float32)
+        self.radius = np.empty(0, dtype=np.int32)
+        self.vy = np.empty(0, dtype=np.float32)
+        self.opacity = np.empty(0, dtype=np.float32)
+        self.lifetime = np.empty(0, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.x)
+
+    def spawn(self, count):
+        """Add `count` fresh particles at random positions."""
+        if count <= 0:
+            return
+        rng = self.rng
+        self.x = np.concatenate([self.x, rng.integers(0, self.width + 1, count).astype(np.float32)])
+        self.y = np.concatenate([self.y, rng.integers(0, self.height + 1, count).astype(np.float32)])
+        lo, hi = self.radius_range
+        self.radius = np.concatenate([self.radius, rng.integers(lo, hi + 1, count).astype(np.int32)])
+        lo, hi = self.speed_range
+        self.vy = np.concatenate([self.vy, rng.uniform(lo, hi, count).astype(np.float32)])
+        self.opacity = np.concatenate([self.opacity, np.full(count, 255.0, dtype=np.float32)])
+        lo, hi = self.lifetime_range
+        self.lifetime = np.concatenate([self.lifetime, rng.integers(lo, hi + 1, count).astype(np.float32)])
+
+    def update(self):
+        """Advance one frame: fall, fade, and drop particles that died or left the canvas."""
+        with span("particles_update"):
+            self._update()
+
+    def _update(self):
+        self.y += self.vy * self.step
+        self.opacity -= (255 / self.lifetime) * self.step
+        alive = (self.opacity > 0) & (self.y < self.height + 5)
+        if not alive.all():
+            self.x, self.y, self.radius = self.x[alive], self.y[alive], self.radius[alive]
+            self.vy, self.opacity, self.lifetime = self.vy[alive], self.opacity[alive], self.lifetime[alive]
+
+    def draw(self, frame):
+        """Rasterize every particle into frame (in place), one batched write per radius."""
+        with span("particles_draw"):
+            return self._draw(frame)
+
+    def _draw(self, frame):
+        h, w = frame.shape[:2]
+        xs = self.x.astype(np.intp)
+        ys = self.y.astype(np.intp)
+        for r in np.unique(self.radius):
+            sel = self.radius == r
+            ody, odx = disc_offsets(int(r))
+            py = (ys[sel, None] + ody).ravel()
+            px = (xs[sel, None] + odx).ravel()
+            inside = (py >= 0) & (py < h) & (px >= 0) & (px < w)
+            frame[py[inside], px[inside]] = self.color
+        return frame
@@ -0,0 +1,250 @@
+import math
+import cv2
+import numpy as np
+from .utils import open_video_writer, ease_in_out, smootherstep, blur_fade
+from .trace import span, phase as mark_phase
+
+# ==========================================================
+# 🎬 Declarative timeline engine
+# ==========================================================
+# An animation is a spec (a plain dict) with a list of phases.
+# Each phase lasts `duration` seconds (or `frames`) and draws one prepared layer on a base,
+# with keyframed properties evaluated on the phase progress p ∈ [0, 1):
+#
+#   scale, angle        → about the layer centre (degrees, counter-clockwise)
+#   dx, dy              → layer centre offset from the canvas centre (px, int)
+#   blur                → Gaussian kernel over the composed frame (px, odd, 0 = off; pyramid
+#                         blur, so the cost doesn't grow with the kernel)
+#   fade                → frame brightness (1 = full, 0 = black)
+#   window              → centred fraction of the layer box that is drawn (1 = all, 0 = none)
+#
+# A property is a constant, a [start, end] pair eased with the phase "ease",
+# or {"wave": amplitude, "cycles": n, "offset": c} for c + amp·sin(2π·n·p).
+# "progress": [a, b] remaps p before evaluation (default [0, 1]).
+# "name" labels the phase in render traces (see trace.py).
+# The layer box (scaled with the layer) is filled with "border" where the
+# rotated/scaled layer doesn't reach; outside the box the base shows.
+# "overlay": true hands that phase's composed frames to render_timeline's
+# overlay callback (per-frame effects such as particles) before they're written.
+#
+# compile_timeline() turns a spec into one plan step per frame; render_timeline()
+# runs the plan with the shared fast paths: one fused affine warp per frame
+# straight into the destination ROI of a preallocated canvas, bases/layers
+# prepared once per job, and identical consecutive steps written as a static hold.
+
+EASINGS = {
+    "linear": lambda t: t,
+    "ease_in_out": ease_in_out,
+    "smoother": smootherstep,
+}
+
+INT_PROPS = ("dx", "dy", "blur")
+PROP_DEFAULTS = {"scale": 1.0, "angle": 0.0, "dx": 0, "dy": 0, "blur": 0, "fade": 1.0, "window": 1.0}
+
+
+def retime(spec, duration, fps):
+    """
+    Copy of spec with its timed phases stretched so they last `duration` seconds.
+    Phase boundaries are rounded on the running total, so no frames are lost to truncation.
+    """
+    timed = sum(phase["duration"] for phase in spec["phases"] if "frames" not in phase)
+    if not timed:
+        return spec  # only fixed-length (or zero-length) phases: nothing to stretch
+    k = duration / timed
+    phases, t, done = [], 0.0, 0
+    for phase in spec["phases"]:
+        if "frames" in phase:
+            phases.append(phase)
+            continue
+        t += phase["duration"] * k
+        end = int(round(t * fps))
+        stretched = {key: value for key, value in phase.items() if key != "duration"}
+        phases.append({**stretched, "frames": end - done})
+        done = end
+    return {**spec, "phases": phases}
+
+
+def eval_prop(value, p, ease):
+    """Value of one keyframed property at phase progress p."""
+    if isinstance(value, dict):
+        return value.get("offset", 0) + value["wave"] * math.sin(p * math.pi * 2 * value.get("cycles", 1))
+    if isinstance(value, (list, tuple)):
+        start, end = value
+        return start + (end - start) * ease(p)
+    return value
+
+
+def layer_matrix(layer_size, canvas_size, scale, angle, dx, dy):
+    """Fused scale + rotation + translation: layer pixels → canvas pixels."""
+    lw, lh = layer_size
+    cw, ch = canvas_size
+    M = cv2.getRotationMatrix2D((lw // 2, lh // 2), angle, scale)
+    M[0, 2] += cw // 2 - lw // 2 + dx
+    M[1, 2] += ch // 2 - lh // 2 + dy
+    return M
+
+
+def layer_box(layer_size, canvas_size, scale, dx, dy, window=1.0):
+    """
+    Destination ROI (x1, y1, x2, y2) of the scaled layer box, clipped to the canvas.
+    window < 1 keeps only that centred fraction of the box.
+    """
+    lw, lh = layer_size
+    cw, ch = canvas_size
+    bw, bh = int(round(lw * scale)), int(round(lh * scale))
+    x1 = cw // 2 - lw // 2 + dx + (lw - bw) // 2
+    y1 = ch // 2 - lh // 2 + dy + (lh - bh) // 2
+    if window < 1:
+        hw, hh = int(bw // 2 * window), int(bh // 2 * window)
+        x1, y1, bw, bh = x1 + bw // 2 - hw, y1 + bh // 2 - hh, 2 * hw, 2 * hh
+    return max(0, x1), max(0, y1), min(cw, x1 + bw), min(ch, y1 + bh)
+
+
+def phase_frames(phase, fps):
+    return phase["frames"] if "frames" in phase else int(phase["duration"] * fps)
+
+
+def phase_names(spec, fps):
+    """Per-frame phase label ("name", or "<index>:<layer>") for tracing."""
+    return [
+        phase.get("name", f"{i}:{phase['layer']}")
+        for i, phase in enumerate(spec["phases"])
+        for _ in range(phase_frames(phase, fps))
+    ]
+
+
+def overlay_frames(spec, fps):
+    """Per-frame flag: does the phase hand its frames to the overlay callback?"""
+    return [
+        phase.get("overlay", False)
+        for phase in spec["phases"]
+        for _ in range(phase_frames(phase, fps))
+    ]
+
+
+def compile_timeline(spec, fps, layers, canvas_size):
+    """
+    Compile a spec into a per-frame plan.
+    Each step is a hashable tuple (layer, base, M, roi, border, blur, fade) so
+    identical consecutive steps can be detected and held.
+    """
+    plan = []
+    for phase in spec["phases"]:
+        n = phase_frames(phase, fps)
+        ease = EASINGS[phase.get("ease", "linear")]
+        p0, p1 = phase.get("progress", (0.0, 1.0))
+        layer = phase["layer"]
+        lh, lw = layers[layer].shape[:2]
+        base = phase.get("base", spec.get("base", (0, 0, 0)))
+        border = tuple(phase.get("border", spec.get("border", (0, 0, 0))))
+        for i in range(n):
+            p = p0 + (p1 - p0) * (i / n)
+            v = {}
+            for name, default in PROP_DEFAULTS.items():
+                v[name] = eval_prop(phase.get(name, default), p, ease)
+                if name in INT_PROPS:
+                    v[name] = int(v[name])
+            M = layer_matrix((lw, lh), canvas_size, v["scale"], v["angle"], v["dx"], v["dy"])
+            roi = layer_box((lw, lh), canvas_size, v["scale"], v["dx"], v["dy"], v["window"])
+            blur = v["blur"] + (1 - v["blur"] % 2) if v["blur"] > 0 else 0  # odd kernel
+            plan.append((
+                layer, base if isinstance(base, str) else tuple(base),
+                tuple(M.ravel().tolist()), roi, border, blur, v["fade"],
+            ))
+    return plan
+
+
+def warp_into(canvas, layer, M, roi, border=(0, 0, 0), base=(0, 0, 0)):
+    """
+    One resample pass: warp layer with the fused matrix M straight into the roi
+    view of the canvas. Outside the roi the canvas is reset to base (a colour or
+    a canvas-sized image); a roi covering the whole canvas skips that copy.
+    """
+    ch, cw = canvas.shape[:2]
+    x1, y1, x2, y2 = roi
+
+    if (x1, y1, x2, y2) != (0, 0, cw, ch):
+        if isinstance(base, np.ndarray):
+            np.copyto(canvas, base)
+        else:
+            cv2.rectangle(canvas, (0, 0), (cw - 1, ch - 1), tuple(base), cv2.FILLED)  # ~30x faster than canvas[:] = base
+
+    if x2 <= x1 or y2 <= y1:
+        return canvas
+
+    M = np.array(M, dtype=np.float64).reshape(2, 3)
+    dst = canvas[y1:y2, x1:x2]
+    tx, ty = M[0, 2], M[1, 2]
+    if (M[0, 0], M[0, 1], M[1, 0], M[1, 1]) == (1, 0, 0, 1) and tx.is_integer() and ty.is_integer():
+        # Whole-pixel shift at scale 1: the warp is exactly a slice copy
+        u1, v1 = x1 - int(tx), y1 - int(ty)
+        crop = layer[max(0, v1):v1 + (y2 - y1), max(0, u1):u1 + (x2 - x1)]
+        if crop.shape[:2] == dst.shape[:2]:
+            np.copyto(dst, crop)
+            return canvas
+
+    M[0, 2] -= x1
+    M[1, 2] -= y1
+    cv2.warpAffine(
+        layer, M, (x2 - x1, y2 - y1), dst=dst,
+        borderMode=cv2.BORDER_CONSTANT, borderValue=border,
+    )
+    return canvas
+
+
+def place_layer(canvas, layer, scale=1.0, angle=0.0, dx=0, dy=0, border=(0, 0, 0), base=(0, 0, 0)):
+    """Draw a layer scaled/rotated about its centre and offset from the canvas centre."""
+    ch, cw = canvas.shape[:2]
+    lh, lw = layer.shape[:2]
+    M = layer_matrix((lw, lh), (cw, ch), scale, angle, dx, dy)
+    roi = layer_box((lw, lh), (cw, ch), scale, dx, dy)
+    with span("warp"):
+        return warp_into(canvas, layer, M, roi, border, base)
+
+
+def compose_step(canvas, step, layers):
+    """Draw one plan step into the preallocated canvas (in place)."""
+    layer, base, M, roi, border, blur, fade = step
+    with span("warp"):
+        warp_into(canvas, layers[layer], M, roi, border, layers[base] if isinstance(base, str) else base)
+
+    # OpenCV's sigma for a kernel size with sigma=0
+    sigma = 0.3 * ((blur - 1) * 0.5 - 1) + 0.8 if blur else 0
+    return blur_fade(canvas, sigma, fade)
+
+
+def render_timeline(spec, layers, out_path, fps, canvas_size, overlay=None, **writer_opts):
+    """
+    Render a timeline spec to out_path. Returns (duration, frames).
+    overlay(canvas) draws on the composed frames of "overlay" phases, in place.
+    """
+    plan = compile_timeline(spec, fps, layers, canvas_size)
+    cw, ch = canvas_size
+    writer = open_video_writer(
+        out_path, fps, canvas_size, total_frames=len(plan),
+        fade_in=spec.get("fade_in", 0), fade_out=spec.get("fade_out", 0), **writer_opts
+    )
+
+    canvas = np.zeros((ch, cw, 3), dtype=np.uint8)
+    names = phase_names(spec, fps)
+    overlaid = overlay_frames(spec, fps) if overlay else [False] * len(plan)
+    prev, pending = None, 0
+    for i, step in enumerate(plan):
+        mark_phase(names[i])
+        if step == prev and not overlaid[i]:
+            pending += 1  # canvas still holds this exact frame
+            continue
+        if pending:
+            writer.write_hold(canvas, pending)
+            pending = 0
+        compose_step(canvas, step, layers)
+        if overlaid[i]:
+            with span("overlay"):
+                overlay(canvas)
+        writer.write(canvas)
+        prev = None if overlaid[i] else step  # an overlaid canvas is never a hold
+    if pending:
+        writer.write_hold(canvas, pending)
+
+    writer.release()
+    return len(plan) / fps, len(plan)
@@ -0,0 +1,97 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# ==========================================================
+# 🔍 Opt-in render tracing (Chrome / Perfetto trace JSON)
+# ==========================================================
+# start_trace() arms a Tracer for this process; the frame loops then record
+#   phase(name)       → one span per contiguous run of frames in a named phase
+#                       (e.g. collage / blur_fade / spin), cat "phase"
+#   with span(name):  → one span per call group per frame (warp, blur_fade, text,
+#                       particles, encode, ...)
+# stop_trace() disarms it and returns the Tracer; save() writes a file that
+# chrome://tracing and ui.perfetto.dev open directly.
+# While no trace is armed span() hands back one shared no-op context manager and
+# phase() returns at once, so the hooks allocate nothing and record nothing.
+
+_active = None
+_NULL_SPAN = nullcontext()
+
+
+class Tracer:
+    """Collects complete ("X") events in microseconds since the trace started."""
+
+    def __init__(self, name="render"):
+        self.name = name
+        self.pid = os.getpid()
+        self.tid = threading.get_native_id()
+        self.events = []
+        self._phase = None  # (name, start)
+        self._origin = time.perf_counter_ns()
+
+    def now(self):
+        return (time.perf_counter_ns() - self._origin) / 1000
+
+    def complete(self, name, cat, start, end, args=None):
+        event = {"name": name, "cat": cat, "ph": "X", "ts": start, "dur": end - start,
+                 "pid": self.pid, "tid": self.tid}
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    @contextmanager
+    def span(self, name, cat="opencv"):
+        start = self.now()
+        try:
+            yield
+        finally:
+            self.complete(name, cat, start, self.now())
+
+    def phase(self, name):
+        """Enter phase `name` (None closes the current one); repeated calls are free."""
+        if self._phase is not None and self._phase[0] == name:
+            return
+        now = self.now()
+        if self._phase is not None:
+            self.complete(self._phase[0], "phase", self._phase[1], now)
+        self._phase = (name, now) if name is not None else None
+
+    def save(self, path):
+        self.phase(None)
+        meta = {"name": "process_name", "ph": "M", "pid": self.pid, "tid": self.tid, "args": {"name": self.name}}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": [meta] + self.events, "displayTimeUnit": "ms"}, f)
+        return path
+
+
+def start_trace(name="render"):
+    """Arm tracing for the renders that follow in this process."""
+    global _active
+    _active = Tracer(name)
+    return _active
+
+
+def stop_trace():
+    """Disarm tracing; returns the Tracer that was recording (or None)."""
+    global _active
+    tracer, _active = _active, None
+    if tracer is not None:
+        tracer.phase(None)
+    return tracer
+
+
+def span(name, cat="opencv"):
+    """Time one call group; a shared no-op when tracing is off."""
+    if _active is None:
+        return _NULL_SPAN
+    return _active.span(name, cat)
+
+
+def phase(name):
+    """Mark the frame loop as being in phase `name`; no-op when tracing is off."""
+    if _active is not None:
+        _active.phase(name)
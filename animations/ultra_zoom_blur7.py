@@ -1,47 +1,33 @@
 import cv2
-import numpy as np
-from moviepy import vfx
-from moviepy.video.io.ImageSequenceClip import ImageSequenceClip
+from .utils import create_gradient_background, add_white_border, render_moviepy_copy, canvas_size, scale_px
+from .timeline import render_timeline, retime
 
 # ==========================================================
-# 🧩 Utility Functions
+# 🎞️ Timeline
 # ==========================================================
-def add_white_border(image, border_width=10):
-    return cv2.copyMakeBorder(
-        image, border_width, border_width, border_width, border_width,
-        cv2.BORDER_CONSTANT, value=(255, 255, 255)
-    )
+def ultra_zoom_blur_timeline(zoom_steps=4, scale=1.0):
+    """zoom → ultra-zoom blur → zoom … (4 zooms, 3 blurs) on the pre-blended layer."""
+    zoom = {"name": "zoom", "duration": 3.0, "layer": "blend", "scale": [1.0, 1.3]}
+    blur = {"name": "ultra_zoom_blur", "duration": 0.8, "layer": "blend", "scale": [1.3, 2.8],
+            "blur": [scale_px(5, scale), scale_px(30, scale)], "fade": [1.0, 0.2]}
+    phases = [zoom]
+    for _ in range(zoom_steps - 1):
+        phases += [blur, zoom]
+    return {"base": [0, 0, 0], "phases": phases, "fade_in": 0.8, "fade_out": 1.0}
 
-def create_gradient_background(height, width, top_color, bottom_color):
-    gradient = np.zeros((height, width, 3), dtype=np.uint8)
-    for y in range(height):
-        alpha = y / height
-        color = (1 - alpha) * np.array(top_color) + alpha * np.array(bottom_color)
-        gradient[y, :] = color
-    return gradient
-
-# ==========================================================
-# 🎞️ Animation Effects
-# ==========================================================
-def apply_zoom(frame, factor):
-    h, w = frame.shape[:2]
-    center = (w // 2, h // 2)
-    M = cv2.getRotationMatrix2D(center, 0, factor)
-    return cv2.warpAffine(frame, M, (w, h))
-
-def apply_blur_fade(frame, blur_strength, alpha):
-    """Apply blur + fade effect."""
-    if blur_strength % 2 == 0:
-        blur_strength += 1
-    blurred = cv2.GaussianBlur(frame, (blur_strength, blur_strength), 0)
-    black = np.zeros_like(frame)
-    return cv2.addWeighted(blurred, alpha, black, 1 - alpha, 0)
 
 # ==========================================================
 # 🎨 Main Animation Function
 # ==========================================================
-def animate_ultra_zoom_blur7(user_image, out_path="animated_output.mp4", fps=30):
-    bg_h, bg_w = 1920, 1080
+def animate_ultra_zoom_blur7(user_image, out_path="animated_output.mp4", fps=30,
+                             moviepy_copy=False, scale=1.0, duration=None, **writer_opts):
+    """
+    4 zooms separated by 3 ultra-zoom blur transitions, with a 0.8 s fade-in /
+    1 s fade-out applied by the encoder on the streamed frames.
+    duration stretches the sequence proportionally (default: 14.4 s).
+    moviepy_copy=True additionally writes the old <name>_moviepy.mp4 render.
+    """
+    bg_w, bg_h = canvas_size(scale)
     top_color = (128, 0, 255)
     bottom_color = (203, 192, 255)
     bg_img = create_gradient_background(bg_h, bg_w, top_color, bottom_color)
@@ -49,62 +35,20 @@ def animate_ultra_zoom_blur7(user_image, out_path="animated_output.mp4", fps=30)
     user_img = cv2.resize(user_image, (bg_w, bg_h))
     bordered = add_white_border(user_img, 0)
 
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    writer = cv2.VideoWriter(out_path, fourcc, fps, (bg_w, bg_h))
-
-    # Frame timing (based on your sequence)
-    zoom_in_frames = int(3.0 * fps)
-    blur_zoom_frames = int(0.8 * fps)
-
-    # Sequence pattern: 4 zooms, 3 blurs
-    sequence = [
-        "zoom", "blur",
-        "zoom", "blur",
-        "zoom", "blur",
-        "zoom"
-    ]
-
-    frames = []
-
-    for step in sequence:
-        if step == "zoom":
-            for i in range(zoom_in_frames):
-                progress = i / zoom_in_frames
-                factor = 1.0 + progress * 0.3
-                frame = bg_img.copy()
-                blended = cv2.addWeighted(frame, 0.3, bordered, 0.7, 0)
-                animated = apply_zoom(blended, factor)
-                writer.write(animated)
-                frames.append(animated[:, :, ::-1])
-
-        elif step == "blur":
-            for i in range(blur_zoom_frames):
-                progress = i / blur_zoom_frames
-                factor = 1.3 + progress * 1.5  # ultra zoom
-                blur_strength = max(3, int(5 + progress * 25))
-                if blur_strength % 2 == 0:
-                    blur_strength += 1
-                alpha = 1.0 - (progress * 0.8)
-                frame = bg_img.copy()
-                blended = cv2.addWeighted(frame, 0.3, bordered, 0.7, 0)
-                zoomed = apply_zoom(blended, factor)
-                animated = apply_blur_fade(zoomed, blur_strength, alpha)
-                writer.write(animated)
-                frames.append(animated[:, :, ::-1])
+    # Prepared layer: the 30/70 background blend never changes, compose it once per job
+    layers = {"blend": cv2.addWeighted(bg_img, 0.3, bordered, 0.7, 0)}
 
-    writer.release()
+    spec = ultra_zoom_blur_timeline(scale=scale)
+    if duration:
+        spec = retime(spec, duration, fps)
+    duration, total_frames = render_timeline(spec, layers, out_path, fps, (bg_w, bg_h), **writer_opts)
 
-    # 🎬 MoviePy Cinematic Output
-    moviepy_out = out_path.replace(".mp4", "_moviepy.mp4")
-    try:
-        clip = ImageSequenceClip(frames, fps=fps).fx(vfx.fadein, 0.8).fx(vfx.fadeout, 1.0)
-        clip.write_videofile(moviepy_out, codec="libx264")
-        print(f"[INFO] 🎞 MoviePy cinematic video created → {moviepy_out}")
-    except Exception as e:
-        print(f"[⚠️] MoviePy cinematic render skipped due to error: {e}")
+    # 🎬 MoviePy Cinematic Output (opt-in)
+    if moviepy_copy:
+        render_moviepy_copy(out_path)
 
-    print(f"[INFO] ✅ Final animation video created:\n  - {out_path}\n  - {moviepy_out}")
-    return out_path, moviepy_out
+    print(f"[INFO] ✅ Final animation video created → {out_path}")
+    return duration, total_frames
 
 
 # ==========================================================
@@ -112,4 +56,4 @@ def animate_ultra_zoom_blur7(user_image, out_path="animated_output.mp4", fps=30)
 # ==========================================================
 if __name__ == "__main__":
     img = cv2.imread("human.jpg")
-    animate_ultra_zoom_blur_sequence(img, "animated_output.mp4", fps=30)
+    animate_ultra_zoom_blur7(img, "animated_output.mp4", fps=30)
@@ -1,72 +1,629 @@
 import cv2
+import numpy as np
 import subprocess
 import os
 import tempfile
+import hashlib
+import json
+import struct
+import math
+import time
+from fractions import Fraction
+from functools import lru_cache
+from urllib.parse import urlparse
 import requests
+from .trace import span
 
-def get_video_duration(out_path):
-    """Return duration (in seconds) of a video file."""
-    cap = cv2.VideoCapture(out_path)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    fps_val = cap.get(cv2.CAP_PROP_FPS)
-    cap.release()
-    duration = total_frames / fps_val if fps_val > 0 else 0
-    return duration
+def ease_in_out(t):
+    """Smoothstep easing (0→1)."""
+    return t * t * (3 - 2 * t)
 
 
-def fix_mp4(out_path):
+def smootherstep(t):
+    """Quintic smootherstep easing (0→1): also zero acceleration at both ends."""
+    return t * t * t * (t * (6 * t - 15) + 10)
+
+
+def add_white_border(image, border_width=10):
+    """Add white border around image."""
+    return cv2.copyMakeBorder(
+        image, border_width, border_width, border_width, border_width,
+        cv2.BORDER_CONSTANT, value=(255, 255, 255)
+    )
+
+
+def safe_paste(bg, img, x, y):
+    """Paste img onto bg at (x, y), clipped to bg's bounds."""
+    h, w = img.shape[:2]
+    bg_h, bg_w = bg.shape[:2]
+    y1, y2 = max(0, y), min(bg_h, y + h)
+    x1, x2 = max(0, x), min(bg_w, x + w)
+    img_y1, img_y2 = max(0, -y), h - max(0, (y + h) - bg_h)
+    img_x1, img_x2 = max(0, -x), w - max(0, (x + w) - bg_w)
+    if y1 < y2 and x1 < x2:
+        bg[y1:y2, x1:x2] = img[img_y1:img_y2, img_x1:img_x2]
+
+
+@lru_cache(maxsize=32)
+def text_layer(lines, canvas_size, font=cv2.FONT_HERSHEY_SIMPLEX, thickness=1):
     """
-    ✅ Re-encode MP4 for browser compatibility (H.264 + AAC)
-    Ensures Chrome/Edge/Firefox can play the file directly.
+    Rasterize a caption block once into an anti-aliased alpha mask.
+    lines: tuple of (text, (x, y) baseline origin, font_scale) in canvas coordinates.
+    Returns (alpha, 1 - alpha, (x, y)): float32 HxW coverage cropped to the text's
+    bounding box, and the box's top-left corner. Memoized, so constant captions are
+    rasterized once per worker and shared by every request; treat the masks as read-only.
     """
-    fixed_path = out_path.replace(".mp4", "_fixed.mp4")
-    try:
+    w, h = canvas_size
+    mask = np.zeros((h, w), dtype=np.uint8)
+    for text, org, font_scale in lines:
+        cv2.putText(mask, text, org, font, font_scale, 255, thickness, cv2.LINE_AA)
+    x, y, bw, bh = cv2.boundingRect(mask)
+    alpha = mask[y:y + bh, x:x + bw].astype(np.float32) / 255
+    inv_alpha = 1 - alpha
+    alpha.setflags(write=False)
+    inv_alpha.setflags(write=False)
+    return alpha, inv_alpha, (x, y)
+
+
+def blend_text_layer(frame, layer, color):
+    """Draw a text_layer() mask onto frame in one masked blend (in place)."""
+    alpha, inv_alpha, (x, y) = layer
+    h, w = alpha.shape
+    if not h or not w:
+        return frame
+    with span("text"):
+        roi = frame[y:y + h, x:x + w]
+        fill = np.empty_like(roi)
+        cv2.rectangle(fill, (0, 0), (w - 1, h - 1), color, cv2.FILLED)
+        cv2.blendLinear(roi, fill, inv_alpha, alpha, dst=roi)
+    return frame
+
+
+# ✅ Output canvas: portrait 1080x1920 at render scale 1.0. Preview renders use a
+# smaller scale and every animation multiplies its pixel constants by the same factor.
+CANVAS_SIZE = (1080, 1920)
+
+
+def canvas_size(scale=1.0):
+    """(w, h) of the output canvas at a render scale."""
+    return int(round(CANVAS_SIZE[0] * scale)), int(round(CANVAS_SIZE[1] * scale))
+
+
+def scale_px(value, scale=1.0):
+    """Scale a pixel constant (offset, border, radius); non-zero values never collapse to 0."""
+    scaled = int(round(value * scale))
+    if scaled == 0 and value:
+        return 1 if value > 0 else -1
+    return scaled
+
+
+def fast_blur(img, sigma, dst=None):
+    """
+    Gaussian blur whose cost doesn't grow with sigma: area-downsample by 2^n until the
+    remaining sigma is ≤ 2 px, blur there, then upsample bilinearly (into dst if given,
+    which may be img itself). Small sigmas use cv2.GaussianBlur directly.
+    """
+    if sigma <= 2:
+        return cv2.GaussianBlur(img, (0, 0), sigma, dst=dst)
+    h, w = img.shape[:2]
+    f = 2 ** math.ceil(math.log2(sigma / 2))
+    small = cv2.resize(img, (max(1, w // f), max(1, h // f)), interpolation=cv2.INTER_AREA)
+    # the area downsample + bilinear upsample already spread ~0.6 px at the small scale
+    residual = math.sqrt(max(0.25, (sigma / f) ** 2 - 0.35))
+    cv2.GaussianBlur(small, (0, 0), residual, dst=small)
+    return cv2.resize(small, (w, h), dst=dst, interpolation=cv2.INTER_LINEAR)
+
+
+def blur_fade(frame, sigma, alpha):
+    """Transition frame, in place: blur by sigma (0 = off) and fade to black (alpha 1 = unchanged)."""
+    if sigma > 0:
+        with span("blur"):
+            fast_blur(frame, sigma, dst=frame)
+    if alpha < 1.0:
+        with span("fade"):
+            cv2.addWeighted(frame, alpha, frame, 0, 0, dst=frame)
+    return frame
+
+
+@lru_cache(maxsize=16)
+def create_gradient_background(height, width, top_color, bottom_color):
+    """
+    Vertical gradient background, built in one vectorized pass and memoized per
+    (size, colors). The returned array is shared and read-only — copy() it per frame.
+    """
+    alpha = (np.arange(height, dtype=np.float64) / height)[:, None]
+    rows = ((1 - alpha) * np.array(top_color) + alpha * np.array(bottom_color)).astype(np.uint8)
+    gradient = np.ascontiguousarray(np.broadcast_to(rows[:, None, :], (height, width, 3)))
+    gradient.setflags(write=False)
+    return gradient
+
+
+# Matroska framing for the encoder pipe (raw BGR in VFW mode). rawvideo carries no
+# timestamps, so every frame of a static hold had to be piped and encoded; as Matroska
+# blocks each frame carries its own timestamp and a hold is one block plus a gap.
+def _ebml(element_id, payload):
+    return element_id + b"\x01" + len(payload).to_bytes(7, "big") + payload
+
+
+def _ebml_uint(element_id, value):
+    return _ebml(element_id, value.to_bytes(max(1, (value.bit_length() + 7) // 8), "big"))
+
+
+def _mkv_header(width, height, fps):
+    """EBML header + live (unknown size) segment with one raw BGR video track, ms timestamps."""
+    ebml = _ebml(b"\x1a\x45\xdf\xa3", b"".join([
+        _ebml_uint(b"\x42\x86", 1), _ebml_uint(b"\x42\xf7", 1), _ebml_uint(b"\x42\xf2", 4),
+        _ebml_uint(b"\x42\xf3", 8), _ebml(b"\x42\x82", b"matroska"),
+        _ebml_uint(b"\x42\x87", 4), _ebml_uint(b"\x42\x85", 2),
+    ]))
+    info = _ebml(b"\x15\x49\xa9\x66", _ebml_uint(b"\x2a\xd7\xb1", 1_000_000))
+    bitmap_info = struct.pack("<IiiHHII16x", 40, width, -height, 1, 24, 0, width * height * 3)  # top-down BGR
+    track = _ebml(b"\xae", b"".join([
+        _ebml_uint(b"\xd7", 1), _ebml_uint(b"\x73\xc5", 1), _ebml_uint(b"\x83", 1), _ebml_uint(b"\x9c", 0),
+        _ebml_uint(b"\x23\xe3\x83", round(1e9 / fps)),  # default frame duration (ns): the last frame keeps it
+        _ebml(b"\x86", b"V_MS/VFW/FOURCC"), _ebml(b"\x63\xa2", bitmap_info),
+        _ebml(b"\xe0", _ebml_uint(b"\xb0", width) + _ebml_uint(b"\xba", height)),
+    ]))
+    segment = b"\x18\x53\x80\x67\x01\xff\xff\xff\xff\xff\xff\xff"
+    return ebml + segment + info + _ebml(b"\x16\x54\xae\x6b", track)
+
+
+def _mkv_frame_header(timestamp_ms, nbytes):
+    """Cluster (one per frame) + SimpleBlock header; the frame bytes follow."""
+    timestamp = _ebml_uint(b"\xe7", timestamp_ms)
+    block_size = 4 + nbytes  # track 1, relative time 0, keyframe flag
+    cluster_size = len(timestamp) + 1 + 8 + block_size
+    return (b"\x1f\x43\xb6\x75\x01" + cluster_size.to_bytes(7, "big") + timestamp
+            + b"\xa3\x01" + block_size.to_bytes(7, "big") + b"\x81\x00\x00\x80")
+
+
+class FFmpegVideoWriter:
+    """
+    ✅ Frame sink that pipes raw BGR frames into one long-running libx264 ffmpeg.
+    Drop-in for cv2.VideoWriter (write / release / isOpened). The output is already
+    browser-ready H.264, so no second re-encoding pass has to run afterwards.
+    progress(frames_written, total_frames) is called after every frame.
+
+    Static holds: write_hold(frame, n) declares a run of identical frames, and
+    (with detect_holds) write() spots repeats of the previous frame on its own.
+    Frames reach ffmpeg as timestamped Matroska blocks and the output is variable
+    frame rate, so a hold is piped and encoded once and simply lasts n frames.
+    Only held frames inside a fade are still sent (the encoder changes those), and
+    a trailing hold is closed with a few frames (see release).
+
+    fade_in / fade_out (seconds) fade from / to black inside the encoder
+    (ffmpeg fade filter), so callers never have to buffer frames for it.
+    crf / preset / threads are the x264 settings of the output profile
+    (threads=None lets x264 pick).
+
+    fragmented: write fragmented MP4 (empty moov + one fragment per 2 s GOP)
+    instead of a faststart file, so the output is playable while it is still
+    growing and can be streamed to a client as the frames are encoded.
+    """
+
+    def __init__(self, out_path, fps, size, crf=23, preset="veryfast", threads=None,
+                 total_frames=None, progress=None, detect_holds=True, fade_in=0, fade_out=0,
+                 fragmented=False):
+        self.out_path = out_path
+        self.fps = fps
+        self.width, self.height = size
+        self.total_frames = total_frames
+        self.progress = progress
+        self.detect_holds = detect_holds
+        self.frames_written = 0
+        self.frames_held = 0  # frames never piped: covered by the previous frame's duration
+        self._last = None
+        self._sent = -1  # index of the last frame piped to ffmpeg
+        # frames [0, fade_in_end) and [fade_out_start, ∞) are altered by the fade filter
+        self._fade_in_end = math.ceil(fade_in * fps) + 1 if fade_in else 0
+        self._fade_out_start = math.floor(total_frames - fade_out * fps) - 1 if fade_out and total_frames else None
+        time_base = Fraction(fps).limit_denominator(1001)
+
         cmd = [
-            "ffmpeg", "-y",
-            "-i", out_path,
-            "-c:v", "libx264",
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "matroska", "-i", "-",
+            "-map", "0:v:0",
+        ]
+        filters = []
+        if self.width % 2 or self.height % 2:
+            # yuv420p needs even dimensions
+            filters.append("pad=ceil(iw/2)*2:ceil(ih/2)*2")
+        if fade_in:
+            filters.append(f"fade=t=in:st=0:d={fade_in}")
+        if fade_out:
+            if total_frames is None:
+                raise ValueError("fade_out needs total_frames")
+            filters.append(f"fade=t=out:st={max(0, total_frames / fps - fade_out)}:d={fade_out}")
+        if filters:
+            cmd += ["-vf", ",".join(filters)]
+        cmd += [
+            "-fps_mode", "vfr", "-enc_time_base", f"{time_base.denominator}/{time_base.numerator}",
+            "-c:v", "libx264", "-preset", preset, "-crf", str(crf),
+        ]
+        if threads:
+            cmd += ["-threads", str(threads)]
+        if fragmented:
+            cmd += ["-g", str(max(1, round(2 * fps))), "-movflags", "frag_keyframe+empty_moov+default_base_moof"]
+        else:
+            cmd += ["-movflags", "+faststart"]  # for web playback
+        cmd += [
             "-pix_fmt", "yuv420p",
-            "-c:a", "aac", "-b:a", "192k",
-            "-movflags", "+faststart",  # for web playback
-            fixed_path
+            out_path,
         ]
+        self.proc = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+        self.proc.stdin.write(_mkv_header(self.width, self.height, fps))
 
-        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        os.replace(fixed_path, out_path)
-        print(f"[INFO] MP4 fixed and replaced → {out_path}")
-    except subprocess.CalledProcessError as e:
-        print(f"[ERROR] ffmpeg failed to re-encode video: {e}")
+    def isOpened(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def write(self, frame):
+        if frame.shape[:2] != (self.height, self.width):
+            raise ValueError(
+                f"Frame size {frame.shape[1]}x{frame.shape[0]} does not match "
+                f"writer size {self.width}x{self.height}"
+            )
+        if self.detect_holds and self._is_repeat(frame):
+            self._repeat(1)
+        else:
+            self._emit(self._remember(frame), self.frames_written)
+            self._advance(1)
+
+    def write_hold(self, frame, count):
+        """Write `frame` `count` times (a declared static hold)."""
+        if count <= 0:
+            return
+        self.write(frame)
+        if count > 1:
+            self._repeat(count - 1)
+
+    def _in_fade(self, index):
+        return index < self._fade_in_end or (self._fade_out_start is not None and index >= self._fade_out_start)
+
+    def _repeat(self, count):
+        """count more frames of the last one; only those inside a fade are piped."""
+        for index in range(self.frames_written, self.frames_written + count):
+            if self._in_fade(index):
+                self._emit(self._last, index)
+            else:
+                self.frames_held += 1
+        self._advance(count)
+
+    def _is_repeat(self, frame):
+        """Cheap strided probe first, exact comparison only when the probe matches."""
+        last = self._last
+        if last is None or frame.shape != last.shape:
+            return False
+        if frame is last:
+            return True
+        return np.array_equal(frame[::16, ::16], last[::16, ::16]) and np.array_equal(frame, last)
+
+    def _remember(self, frame):
+        """Keep a private copy of the last frame (callers may reuse their buffers)."""
+        buf = np.ascontiguousarray(frame, dtype=np.uint8)
+        if self._last is None or self._last.shape != buf.shape:
+            self._last = np.empty_like(buf)
+        np.copyto(self._last, buf)
+        return self._last
+
+    def _emit(self, buf, index):
+        """Pipe one frame, timestamped as frame `index`."""
+        try:
+            with span("encode", "encode"):
+                self.proc.stdin.write(_mkv_frame_header(round(index * 1000 / self.fps), buf.nbytes))
+                self.proc.stdin.write(buf.data)
+        except BrokenPipeError:
+            self._finish()  # raises with ffmpeg's error
+        self._sent = index
+
+    def _advance(self, count):
+        self.frames_written += count
+        if self.progress is not None:
+            self.progress(self.frames_written, self.total_frames)
+
+    def release(self):
+        """Close the pipe and wait for ffmpeg to finish the file."""
+        if self.proc is None:
+            return
+        # x264's B-frames put each dts up to 2 frames behind its pts and the track ends at the
+        # last dts, so a trailing hold is closed with its last 3 frames piped densely
+        last = self.frames_written - 1
+        for index in range(max(self._sent + 1, last - 2), last + 1):
+            self._emit(self._last, index)
+            self.frames_held -= 1
+        self._finish()
+
+    def _finish(self):
+        if self.proc is None:
+            return
+        proc, self.proc = self.proc, None
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        with span("flush", "encode"):
+            err = proc.stderr.read().decode(errors="replace").strip()
+            proc.stderr.close()
+            returncode = proc.wait()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg encoder failed for {self.out_path}: {err}")
+        if self.frames_held:
+            print(f"[INFO] {self.frames_held}/{self.frames_written} frames were static holds → {self.out_path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def open_video_writer(out_path, fps, size, **writer_opts):
+    """Open the single-pass H.264 frame sink used by every animate_* function."""
+    return FFmpegVideoWriter(out_path, fps, size, **writer_opts)
+
+
+def render_moviepy_copy(video_path):
+    """
+    Opt-in secondary MoviePy render (<name>_moviepy.mp4) of a finished video.
+    Frames are streamed from the encoded file, so memory stays flat; fades are
+    already part of the main output.
+    """
+    moviepy_out = video_path.replace(".mp4", "_moviepy.mp4")
+    try:
+        from moviepy.editor import VideoFileClip  # optional dependency, only needed here
+
+        with VideoFileClip(video_path) as clip:
+            clip.write_videofile(moviepy_out, codec="libx264", logger=None)
+        print(f"[INFO] 🎞 MoviePy cinematic video created → {moviepy_out}")
+        return moviepy_out
     except Exception as e:
-        print(f"[ERROR] fix_mp4 unexpected error: {e}")
+        print(f"[⚠️] MoviePy cinematic render skipped due to error: {e}")
+        return None
+
+
+# ==========================================================
+# 🗂️ Static asset cache (backgrounds etc.)
+# ==========================================================
+ASSET_CACHE_DIR = os.getenv("ASSET_CACHE_DIR", os.path.join("cache", "assets"))
+ASSET_TTL = int(os.getenv("ASSET_TTL", "86400"))  # seconds before revalidating with the CDN
+_static_images = {}  # url → (image, checked_at), per worker process
+
 
+def _asset_paths(url):
+    name = hashlib.sha256(url.encode()).hexdigest()
+    base = os.path.join(ASSET_CACHE_DIR, name)
+    return base + ".img", base + ".json"
 
-def add_audio_to_video(video_path, audio_url, output_path):
+
+def _read_asset(data_path):
+    img = cv2.imdecode(np.fromfile(data_path, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is not None:
+        img.setflags(write=False)  # shared by every render in this worker
+    return img
+
+
+def load_static_image(url):
     """
-    ✅ Add background audio from a URL (or local file) to the given video.
-    Keeps the video duration same as the shorter of the two.
+    Load a constant image asset once per worker.
+    Memory → disk → CDN, revalidated with ETag / Last-Modified after ASSET_TTL.
+    If the CDN is unreachable a stale copy is used instead of failing the render.
+    Returns a read-only BGR image (copy it before drawing on it) or None.
     """
+    now = time.time()
+    cached = _static_images.get(url)
+    if cached is not None and now - cached[1] < ASSET_TTL:
+        return cached[0]
+
+    data_path, meta_path = _asset_paths(url)
+    meta = {}
     try:
-        # Step 1: Download audio if it's a URL
-        if audio_url.startswith("http"):
-            r = requests.get(audio_url, timeout=20)
-            if r.status_code != 200:
-                print("[ERROR] Failed to download audio:", audio_url)
-                return None
-            temp_audio = tempfile.NamedTemporaryFile(delete=False, suffix=".aac")
-            temp_audio.write(r.content)
-            temp_audio.close()
-            audio_file = temp_audio.name
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        pass
+    on_disk = meta and os.path.exists(data_path)
+
+    if on_disk and now - meta.get("checked_at", 0) < ASSET_TTL:
+        img = _read_asset(data_path)  # revalidated recently by another worker
+        if img is not None:
+            _static_images[url] = (img, meta["checked_at"])
+            return img
+
+    headers = {}
+    if on_disk:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    try:
+        resp = requests.get(url, headers=headers, timeout=10)
+        if resp.status_code == 304 and on_disk:
+            img = cached[0] if cached is not None else _read_asset(data_path)
+        elif resp.status_code == 200:
+            img = cv2.imdecode(np.frombuffer(resp.content, np.uint8), cv2.IMREAD_COLOR)
+            if img is None:
+                raise ValueError("asset is not a decodable image")
+            img.setflags(write=False)
+            os.makedirs(ASSET_CACHE_DIR, exist_ok=True)
+            with open(data_path + ".tmp", "wb") as f:
+                f.write(resp.content)
+            os.replace(data_path + ".tmp", data_path)
+            meta = {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
         else:
-            audio_file = audio_url
+            raise ValueError(f"HTTP {resp.status_code}")
+    except Exception as e:
+        stale = cached[0] if cached is not None else (_read_asset(data_path) if on_disk else None)
+        print(f"[WARN] Static asset refresh failed ({e}); {'using stale copy' if stale is not None else 'no copy available'}: {url}")
+        if stale is not None:
+            _static_images[url] = (stale, now)
+        return stale
 
-        # Step 2: Merge video + audio with FFmpeg
+    meta["checked_at"] = now
+    os.makedirs(ASSET_CACHE_DIR, exist_ok=True)
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(meta_path + ".tmp", meta_path)
+    _static_images[url] = (img, now)
+    return img
+
+
+def warm_static_assets(urls):
+    """Pre-load assets at startup / worker init so the first render doesn't pay for them."""
+    for url in urls:
+        if load_static_image(url) is not None:
+            print(f"[INFO] Static asset ready → {url}")
+
+
+# ==========================================================
+# 🎵 Audio asset cache (soundtracks)
+# ==========================================================
+# Soundtracks are reused across many jobs, so each source is downloaded once
+# (streamed to disk), transcoded once to AAC and kept as <sha256(url)>.m4a.
+# Temp files are unique per call, so concurrent jobs on the same URL can't clash.
+# Muxing it into a render is then a pure stream copy (mux_audio).
+AUDIO_CACHE_DIR = os.path.join(ASSET_CACHE_DIR, "audio")
+AUDIO_MAX_BYTES = int(os.getenv("AUDIO_MAX_BYTES", str(50 * 1024 * 1024)))
+
+
+def _audio_paths(url):
+    name = hashlib.sha256(url.encode()).hexdigest()
+    base = os.path.join(AUDIO_CACHE_DIR, name)
+    return base + ".m4a", base + ".json"
+
+
+def _download_to(url, path, headers):
+    """Stream url into path (capped at AUDIO_MAX_BYTES). Returns the response (body consumed)."""
+    with requests.get(url, headers=headers, timeout=20, stream=True) as resp:
+        if resp.status_code != 200:
+            return resp
+        size = 0
+        with open(path, "wb") as f:
+            for chunk in resp.iter_content(1024 * 1024):
+                size += len(chunk)
+                if size > AUDIO_MAX_BYTES:
+                    raise ValueError(f"audio exceeds {AUDIO_MAX_BYTES} bytes")
+                f.write(chunk)
+        return resp
+
+
+def _transcode_audio(src, data_path):
+    """Transcode src to AAC in an .m4a next to data_path, then move it into place; returns its digest."""
+    fd, tmp = tempfile.mkstemp(dir=AUDIO_CACHE_DIR, suffix=".m4a")
+    os.close(fd)
+    try:
+        subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-i", src,
+             "-map", "0:a:0", "-vn", "-c:a", "aac", "-b:a", "192k", tmp],
+            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        h = hashlib.sha256()
+        with open(tmp, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        os.replace(tmp, data_path)
+        return h.hexdigest()
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def is_http_url(url):
+    return urlparse(url).scheme in ("http", "https")
+
+
+def fetch_audio(audio_url):
+    """
+    Soundtrack from an http(s) URL as a cached AAC (.m4a) file, shared on disk by every
+    process. Revalidated with ETag / Last-Modified after ASSET_TTL (a stale copy is used
+    if the source is unreachable). Anything but an http(s) URL is refused, so a
+    request parameter can never name a file on this machine (see fetch_local_audio).
+    Returns (path, digest) — digest identifies the audio for render cache keys — or None.
+    """
+    if not is_http_url(audio_url):
+        print(f"[WARN] Audio fetch refused (not an http(s) URL): {audio_url}")
+        return None
+    return _cache_audio(audio_url, local=False)
+
+
+def fetch_local_audio(path):
+    """fetch_audio for a local file (benchmarks, scripts); re-transcoded when the file changes."""
+    return _cache_audio(path, local=True)
+
+
+def _cache_audio(audio_url, local):
+    now = time.time()
+    data_path, meta_path = _audio_paths(audio_url)
+    meta = {}
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        pass
+    on_disk = bool(meta) and os.path.exists(data_path)
+
+    download = None
+    try:
+        os.makedirs(AUDIO_CACHE_DIR, exist_ok=True)
+        fd, download = tempfile.mkstemp(dir=AUDIO_CACHE_DIR, suffix=".download")
+        os.close(fd)
+        if local:
+            st = os.stat(audio_url)
+            source = f"{st.st_mtime_ns}:{st.st_size}"
+            if on_disk and meta.get("source") == source:
+                return data_path, meta["digest"]
+            meta = {"source": source, "digest": _transcode_audio(audio_url, data_path)}
+        else:
+            if on_disk and now - meta.get("checked_at", 0) < ASSET_TTL:
+                return data_path, meta["digest"]
+            headers = {}
+            if on_disk:
+                if meta.get("etag"):
+                    headers["If-None-Match"] = meta["etag"]
+                if meta.get("last_modified"):
+                    headers["If-Modified-Since"] = meta["last_modified"]
+            resp = _download_to(audio_url, download, headers)
+            if resp.status_code == 304 and on_disk:
+                pass
+            elif resp.status_code == 200:
+                meta = {
+                    "etag": resp.headers.get("ETag"),
+                    "last_modified": resp.headers.get("Last-Modified"),
+                    "digest": _transcode_audio(download, data_path),
+                }
+                print(f"[INFO] Audio cached as AAC → {data_path}")
+            else:
+                raise ValueError(f"HTTP {resp.status_code}")
+    except Exception as e:
+        stale = (data_path, meta["digest"]) if on_disk and not local else None
+        print(f"[WARN] Audio fetch failed ({e}); {'using stale copy' if stale else 'no copy available'}: {audio_url}")
+        return stale
+    finally:
+        if download and os.path.exists(download):
+            os.remove(download)
+
+    meta["checked_at"] = now
+    fd, tmp = tempfile.mkstemp(dir=AUDIO_CACHE_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_path)
+    return data_path, meta["digest"]
+
+
+def mux_audio(video_path, audio_path, output_path):
+    """
+    ✅ Merge a video with an AAC track (fetch_audio output): both streams are copied,
+    nothing is re-encoded. Keeps the duration of the shorter of the two.
+    """
+    try:
         cmd = [
             "ffmpeg", "-y",
             "-i", video_path,
-            "-i", audio_file,
-            "-c:v", "copy",
-            "-c:a", "aac",
+            "-i", audio_path,
+            "-map", "0:v:0", "-map", "1:a:0",
+            "-c", "copy",
             "-shortest",
+            "-movflags", "+faststart",  # for web playback
             output_path
         ]
         subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
@@ -80,8 +637,29 @@ def add_audio_to_video(video_path, audio_url, output_path):
             return None
 
     except subprocess.CalledProcessError as e:
-        print(f"[ERROR] add_audio_to_video failed (ffmpeg): {e}")
+        print(f"[ERROR] mux_audio failed (ffmpeg): {e}")
+        return None
+    except Exception as e:
+        print(f"[ERROR] mux_audio unexpected error: {e}")
         return None
+
+
+def faststart_copy(video_path, output_path):
+    """
+    ✅ Rewrite a fragmented MP4 (FFmpegVideoWriter(fragmented=True)) as a regular one with
+    the moov up front, the same layout mux_audio delivers. Stream copy, no re-encode.
+    """
+    try:
+        cmd = [
+            "ffmpeg", "-y",
+            "-i", video_path,
+            "-map", "0:v:0",
+            "-c", "copy",
+            "-movflags", "+faststart",  # for web playback
+            output_path
+        ]
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return output_path
     except Exception as e:
-        print(f"[ERROR] add_audio_to_video unexpected error: {e}")
+        print(f"[ERROR] faststart_copy failed: {e}")
         return None
@@ -4,8 +4,13 @@ import aiohttp
 import os
 import uuid
 import asyncio
-import requests  # 🔹 Added for Cloudinary upload
+import json
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 from fastapi import FastAPI, Query, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
@@ -14,11 +19,11 @@ sys.path.append(os.path.join(os.getcwd(), "venv", "Lib", "site-packages"))
 print("✅ Custom site-packages path added:", os.path.join(os.getcwd(), "venv", "Lib", "site-packages"))
 
 # ✅ Import animations + utils
-from animations.vertical_reveal import animate_collage_tapestry
+from animations.vertical_reveal import animate_collage_tapestry, BACKGROUND_URL
 from animations.zoomout_zoomin2 import animate_zoomin_zoomout_fadein2
 from animations.center_reveal_slide3 import animate_center_reveal_slide3
 from animations.swing_r_swing_d4 import animate_swing_r_swing_d4
-from animations.image_to_cartoon5 import animate_image_to_cartoon5
+from animations.image_to_cartoon5 import animate_image_to_cartoon5, CARTOON_QUALITY
 from animations.zoomout_with_effect6 import animate_zoomout_with_effect6
 from animations.ultra_zoom_blur7 import animate_ultra_zoom_blur7
 
@@ -26,7 +31,14 @@ from animations.ultra_zoom_blur7 import animate_ultra_zoom_blur7
 
 
 
-from animations.utils import fix_mp4, add_audio_to_video
+from animations.utils import canvas_size, faststart_copy, fetch_audio, is_http_url, mux_audio, warm_static_assets
+from animations.trace import start_trace, stop_trace, span
+from storage import storage_from_env
+from metrics import Counter, Gauge, Histogram, FPS_BUCKETS, render_metrics
+from render_cache import (
+    cache_enabled, cache_key, image_digest,
+    cache_get_meta, cache_put_meta, cache_fetch_file, cache_put_file,
+)
 
 
 # ✅ FastAPI app
@@ -45,11 +57,81 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ✅ Animation names accepted by render_animation
+ANIMATIONS = [
+    "reveal_vertical_zoomout",
+    "zoomin_zoomout_fadein2",
+    "center_reveal_slide3",
+    "swing_r_swing_d4",
+    "image_to_cartoon5",
+    "zoomout_with_effect6",
+    "ultra_zoom_blur7",
+]
+# … of which these start with cv2.resize(user_image, canvas_size(scale)): /batch resizes each
+# image once per scale and sends them that (cv2.resize to the same size is a plain copy)
+CANVAS_INPUT_ANIMATIONS = ("center_reveal_slide3", "image_to_cartoon5", "zoomout_with_effect6", "ultra_zoom_blur7")
+
 # ✅ Output folder setup
 OUTDIR = "outputs"
+TRACE_DIR = os.path.join(OUTDIR, "traces")  # Chrome trace JSON of traced renders
 os.makedirs(OUTDIR, exist_ok=True)
 app.mount("/outputs", StaticFiles(directory=OUTDIR), name="outputs")
 
+# ✅ Constant assets every worker keeps decoded in memory
+STATIC_ASSETS = [BACKGROUND_URL]
+
+# ✅ Render worker pool setup
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", os.cpu_count() or 1))
+RENDER_QUEUE_SIZE = int(os.getenv("RENDER_QUEUE_SIZE", RENDER_WORKERS * 2))
+RENDER_RETRY_AFTER = int(os.getenv("RENDER_RETRY_AFTER", "15"))
+BATCH_MAX_VARIANTS = int(os.getenv("BATCH_MAX_VARIANTS", "12"))  # images × animations per /batch call
+
+# ✅ Outbound HTTP: one pooled session for the app's lifetime
+HTTP_LIMIT = int(os.getenv("HTTP_LIMIT", "100"))                    # open connections in total
+HTTP_LIMIT_PER_HOST = int(os.getenv("HTTP_LIMIT_PER_HOST", "10"))   # … and per host
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(25 * 1024 * 1024)))
+http_session = None
+
+# ✅ Where finished videos go (STORAGE_BACKEND env, see storage.py)
+storage = storage_from_env()
+
+# ✅ Output profiles (profile query param), merged into the animate_* kwargs:
+#   scale (canvas = 1080x1920 × scale), fps, duration (s, stretches the animation)
+#   and the x264 crf / preset / threads. Unset keys keep each animation's own defaults.
+OUTPUT_PROFILES = {
+    "1080p": {},                                           # 1080x1920, native fps + duration
+    "720p": {"scale": 2 / 3, "fps": 24},                   # 720x1280 @ 24
+    "540p": {"scale": 1 / 2, "fps": 24, "crf": 25},        # 540x960 @ 24
+    "720p_short": {"scale": 2 / 3, "fps": 24, "duration": 6},  # 6 s cut for stories / reels
+}
+DEFAULT_OUTPUT_PROFILE = os.getenv("DEFAULT_OUTPUT_PROFILE", "1080p")
+ENCODER_THREADS = int(os.getenv("ENCODER_THREADS", "0"))  # x264 threads per render (0 = auto)
+TRACE_RENDERS = os.getenv("TRACE_RENDERS", "0") == "1"  # trace every job, as if ?trace=1 (debugging only)
+
+# ✅ Render quality presets (quality query param), applied on top of the profile
+#   full  → the profile as is
+#   draft → preview: 1/3-scale canvas, 12 fps, ultrafast encode (same motion, every coordinate scaled)
+RENDER_QUALITY = {
+    "full": {},
+    "draft": {"scale": 1 / 3, "fps": 12, "preset": "ultrafast", "crf": 30},
+}
+
+# ✅ Metrics (GET /metrics, Prometheus text format, see metrics.py)
+#   stages: download, prepare (/batch, animation="batch"), queue (waiting for a worker), render,
+#   audio, mux, upload
+STAGE_SECONDS = Histogram("anim_stage_seconds", "Wall time of one job stage.", ("stage", "animation"))
+JOB_SECONDS = Histogram("anim_job_seconds", "Job submit to finish.", ("animation", "status"))
+FRAMES_RENDERED = Counter("anim_frames_rendered_total", "Frames rendered (cache misses only).", ("animation",))
+RENDER_FPS = Histogram("anim_render_fps", "Frames per second of each fresh render.", ("animation",), buckets=FPS_BUCKETS)
+RENDER_CACHE = Counter("anim_render_cache_total", "Render cache outcome per job: uploaded, final, render, miss, disabled.", ("result",))
+WORKER_BUSY = Counter("anim_render_worker_busy_seconds_total", "Time render workers spent on jobs (rate / workers = utilization).")
+REJECTED = Counter("anim_rejected_total", "Requests answered 429 because the render queue was full.")
+
+
+def animation_label(animation):
+    """Metric label for a (user supplied) animation name, bounded to the known set."""
+    return animation if animation in ANIMATIONS else "invalid"
+
 
 # ---- Health check ----
 @app.head("/")
@@ -62,175 +144,816 @@ async def head_check():
 async def home():
     return {
         "message": "🎥 Animation API is running!",
-        "available_animations": [
-            "reveal_vertical_zoomout",
-            "zoomin_zoomout_fadein2",
-            "center_reveal_slide3",
-            "swing_r_swing_d4",
-            "image_to_cartoon5",
-            "zoomout_with_effect6",
-            "ultra_zoom_blur7"
-        ],
-        "example_request": "/process?image_url=https://yourimage.jpg&animation=zoomin_zoomout_fadein2&audio_url=https://youraudio.aac"
+        "available_animations": ANIMATIONS,
+        "output_profiles": OUTPUT_PROFILES,
+        "example_request": "/process?image_url=https://yourimage.jpg&animation=zoomin_zoomout_fadein2&audio_url=https://youraudio.aac",
+        "example_job": "POST /jobs?image_url=https://yourimage.jpg&animation=swing_r_swing_d4 → GET /jobs/{job_id}/events",
+        "example_preview": "/process?image_url=https://yourimage.jpg&animation=swing_r_swing_d4&quality=draft",
+        "example_stream": "/process?image_url=https://yourimage.jpg&animation=swing_r_swing_d4&stream=true",
+        "example_batch": "/batch?image_url=https://yourimage.jpg&animation=swing_r_swing_d4&animation=ultra_zoom_blur7"
     }
 
 
+# ---- Helper: Pooled HTTP session ----
+def get_http_session():
+    """App-lifetime aiohttp session: keep-alive connections, per-host limit, DNS cache."""
+    global http_session
+    if http_session is None or http_session.closed:
+        http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=HTTP_LIMIT, limit_per_host=HTTP_LIMIT_PER_HOST, ttl_dns_cache=300
+            ),
+            timeout=aiohttp.ClientTimeout(total=30),
+        )
+    return http_session
+
+
 # ---- Helper: Download image ----
 async def fetch_image(url: str):
-    """Download image from public URL."""
+    """
+    Download image bytes from a public URL (streamed, capped at IMAGE_MAX_BYTES).
+    Decoding happens in the render worker (decode_image), off the event loop.
+    """
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=30) as resp:
-                if resp.status != 200:
-                    print(f"[ERROR] Invalid image URL: {url}")
+        async with get_http_session().get(url) as resp:
+            if resp.status != 200:
+                print(f"[ERROR] Invalid image URL: {url}")
+                return None
+            if (resp.content_length or 0) > IMAGE_MAX_BYTES:
+                print(f"[ERROR] Image too large ({resp.content_length} bytes): {url}")
+                return None
+            data = bytearray()
+            async for chunk in resp.content.iter_chunked(64 * 1024):
+                data += chunk
+                if len(data) > IMAGE_MAX_BYTES:
+                    print(f"[ERROR] Image exceeds {IMAGE_MAX_BYTES} bytes: {url}")
                     return None
-                data = await resp.read()
-                nparr = np.frombuffer(data, np.uint8)
-                return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            return bytes(data)
     except Exception as e:
         print(f"[ERROR] fetch_image failed: {e}")
         return None
 
 
-# ---- Helper: Upload video to Cloudinary ----
-def upload_to_cloudinary(local_path: str):
-    """Upload the video to Cloudinary and return its secure URL."""
-    cloud_name = "dvsubaggj"
-    upload_preset = "flutter_unsigned_upload"
-    url = f"https://api.cloudinary.com/v1_1/{cloud_name}/video/upload"
+def decode_image(image):
+    """Encoded image bytes → BGR array (arrays pass through). Runs in the render worker."""
+    if isinstance(image, np.ndarray):
+        return image
+    img = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("invalid or unsupported image data")
+    return img
 
-    try:
-        with open(local_path, "rb") as file_data:
-            res = requests.post(
-                url,
-                files={"file": file_data},
-                data={"upload_preset": upload_preset},
-                timeout=120
-            )
-        result = res.json()
-        if res.status_code == 200:
-            secure_url = result["secure_url"]
-            print(f"[✅] Cloudinary upload successful → {secure_url}")
-            return secure_url
-        else:
-            print(f"[❌] Cloudinary upload failed → {result}")
-            return None
-    except Exception as e:
-        print(f"[ERROR] Upload to Cloudinary failed: {e}")
-        return None
 
+def prepare_image(image, scales=()):
+    """
+    Batch preprocessing, once per image: the render cache key (digest of the decoded image) and
+    the canvas-sized resize for every scale in scales. Returns dict(data, key, canvas).
+    """
+    img = decode_image(image)
+    return {
+        "data": image,
+        "key": image_digest(img) if cache_enabled() else None,
+        "canvas": {scale: cv2.resize(img, canvas_size(scale)) for scale in scales},
+    }
 
-# ---- Animation runner ----
-def run_animation_sync(img, out_path, animation, audio_url=None):
-    """Run selected animation and optionally add audio."""
+
+def batch_input(prepared, animation, params):
+    """What a batch variant sends to its worker: the shared canvas resize, else the encoded bytes."""
+    if animation in CANVAS_INPUT_ANIMATIONS:
+        return prepared["canvas"][params.get("scale", 1.0)]
+    return prepared["data"]
+
+
+async def fetch_prepared_image(url: str, scales=()):
+    """
+    Batch: download an image and run prepare_image on it a single time; every variant rendered
+    from it awaits the same task (see batch_input). prepare_image's dict, or None.
+    """
+    t = time.time()
+    image = await fetch_image(url)
+    if image is None:
+        return None
     try:
-        # ✅ Select animation
-        if animation == "reveal_vertical_zoomout":
-            duration, frames = animate_collage_tapestry(img, out_path)
-        elif animation == "zoomin_zoomout_fadein2":
-            duration, frames = animate_zoomin_zoomout_fadein2(img, out_path)
-        elif animation == "center_reveal_slide3":
-            duration, frames = animate_center_reveal_slide3(img, out_path)
-        elif animation == "swing_r_swing_d4":
-            duration, frames = animate_swing_r_swing_d4(img, out_path)
-        elif animation == "image_to_cartoon5":
-            duration, frames = animate_image_to_cartoon5(img, out_path)
-        elif animation == "zoomout_with_effect6":
-            duration, frames = animate_zoomout_with_effect6(img, out_path)
-        elif animation == "ultra_zoom_blur7":
-            duration, frames = animate_ultra_zoom_blur7(img, out_path)
+        prepared = await asyncio.to_thread(prepare_image, image, scales)
+    except ValueError as e:
+        print(f"[ERROR] {e}: {url}")
+        return None
+    STAGE_SECONDS.observe(time.time() - t, stage="prepare", animation="batch")
+    return prepared
 
 
-        else:
-            raise ValueError(f"Invalid animation type: {animation}")
+# ---- Helper: Upload video (Cloudinary by default, see storage.py) ----
+async def upload_video(local_path: str):
+    """Upload the video through the configured storage backend and return its public URL."""
+    try:
+        url = await storage.upload(get_http_session(), local_path)
+        print(f"[✅] {storage.name} upload successful → {url}")
+        return url
+    except Exception as e:
+        print(f"[ERROR] Upload to {storage.name} failed: {e}")
+        return None
 
-        # ✅ Re-encode for browser
-        fix_mp4(out_path)
 
-        # ✅ Add custom audio (if provided)
-        if audio_url:
-            out_with_audio = out_path.replace(".mp4", "_audio.mp4")
-            added = add_audio_to_video(out_path, audio_url, out_with_audio)
-            if added:
-                os.replace(out_with_audio, out_path)
-                print(f"[INFO] Audio added from {audio_url}")
+# ---- Animation runner ----
+def animation_params(animation, cartoon_quality=None, quality="full", profile=DEFAULT_OUTPUT_PROFILE):
+    """Per-request animate_* keyword arguments (also part of the render cache key)."""
+    params = {**OUTPUT_PROFILES[profile], **RENDER_QUALITY[quality]}
+    if ENCODER_THREADS and "threads" not in params:
+        params["threads"] = ENCODER_THREADS
+    if animation == "image_to_cartoon5":
+        if cartoon_quality:
+            params["quality"] = cartoon_quality
+        elif quality == "draft":
+            params["quality"] = "fast"
+    return params
+
+
+def invalid_param_response(name, value, choices):
+    return JSONResponse(
+        status_code=400,
+        content={"error": f"❌ Invalid {name}: {value} (choose from {', '.join(choices)})"},
+    )
+
+
+def request_params(animations, cartoon_quality=None, quality="full", profile=DEFAULT_OUTPUT_PROFILE, audio_url=None):
+    """
+    Validate the request options shared by /process, /jobs and /batch.
+    Returns {animation: animation_params(...)}, or the 400 response for the first invalid value.
+    """
+    if audio_url and not is_http_url(audio_url):
+        return JSONResponse(status_code=400, content={"error": f"❌ Invalid audio_url: {audio_url} (http(s) URL required)"})
+    for name in animations:
+        if name not in ANIMATIONS:
+            return invalid_param_response("animation", name, ANIMATIONS)
+    if quality not in RENDER_QUALITY:
+        return invalid_param_response("quality", quality, RENDER_QUALITY)
+    if profile not in OUTPUT_PROFILES:
+        return invalid_param_response("profile", profile, OUTPUT_PROFILES)
+    if cartoon_quality and cartoon_quality not in CARTOON_QUALITY:
+        return invalid_param_response("cartoon_quality", cartoon_quality, CARTOON_QUALITY)
+    return {name: animation_params(name, cartoon_quality, quality, profile) for name in animations}
+
+
+def render_animation(img, out_path, animation, params=None, **writer_opts):
+    """Dispatch to the selected animate_* function."""
+    kwargs = {**(params or {}), **writer_opts}
+    if animation == "reveal_vertical_zoomout":
+        duration, frames = animate_collage_tapestry(img, out_path, **kwargs)
+    elif animation == "zoomin_zoomout_fadein2":
+        duration, frames = animate_zoomin_zoomout_fadein2(img, out_path, **kwargs)
+    elif animation == "center_reveal_slide3":
+        duration, frames = animate_center_reveal_slide3(img, out_path, **kwargs)
+    elif animation == "swing_r_swing_d4":
+        duration, frames = animate_swing_r_swing_d4(img, out_path, **kwargs)
+    elif animation == "image_to_cartoon5":
+        duration, frames = animate_image_to_cartoon5(img, out_path, **kwargs)
+    elif animation == "zoomout_with_effect6":
+        duration, frames = animate_zoomout_with_effect6(img, out_path, **kwargs)
+    elif animation == "ultra_zoom_blur7":
+        duration, frames = animate_ultra_zoom_blur7(img, out_path, **kwargs)
+
+
+    else:
+        raise ValueError(f"Invalid animation type: {animation}")
+    return duration, frames
+
+
+def run_animation_sync(image, out_path, animation, job_id=None, params=None, reuse_upload=True,
+                       trace_path=None, image_key=None):
+    """
+    Render the selected animation (silent) into out_path, reusing the render cache when possible.
+    image is the encoded download (decoded here, in the worker) or an already decoded array
+    (/batch: the shared canvas-sized resize, see batch_input).
+    Cache levels: silent render (image + animation + params) → uploaded video_url; the
+    uploaded level is skipped (reuse_upload=False) when a soundtrack is muxed on afterwards.
+    trace_path: write a Chrome trace of the render there (always renders fresh).
+    image_key: image_digest(img) when the caller already has it (batch, see prepare_image).
+    Returns dict(duration, frames, cache_key, cache_hit, video_url).
+    """
+    if trace_path:
+        start_trace(f"{animation} {job_id or ''}".strip())
+    writer_opts = {"fragmented": True}  # readable while it grows (see /jobs/{job_id}/video)
+    if job_id is not None and progress_queue is not None:
+        writer_opts["progress"] = make_progress_reporter(job_id)
 
+    try:
+        with span("decode", "prepare"):
+            img = decode_image(image)
+        if not cache_enabled():
+            duration, frames = render_animation(img, out_path, animation, params, **writer_opts)
+            print(f"[INFO] Animation '{animation}' completed successfully → {out_path}")
+            return {"duration": duration, "frames": frames, "cache_key": None, "cache_hit": None, "video_url": None}
+
+        render_key = cache_key(image_key or image_digest(img), animation, params or {})
+        meta = cache_get_meta(render_key) if not trace_path else None
+        if meta and reuse_upload and meta.get("video_url"):
+            print(f"[INFO] Render cache hit (uploaded) → {meta['video_url']}")
+            return {"duration": meta["duration"], "frames": meta["frames"], "cache_key": render_key,
+                    "cache_hit": "uploaded", "video_url": meta["video_url"]}
+        if meta and cache_fetch_file(render_key, out_path):
+            print(f"[INFO] Render cache hit (silent render) → {out_path}")
+            return {"duration": meta["duration"], "frames": meta["frames"], "cache_key": render_key,
+                    "cache_hit": "render", "video_url": None}
+
+        duration, frames = render_animation(img, out_path, animation, params, **writer_opts)
+        cache_put_file(render_key, out_path)
+        cache_put_meta(render_key, {"duration": duration, "frames": frames})
         print(f"[INFO] Animation '{animation}' completed successfully → {out_path}")
-        return duration, frames
+        return {"duration": duration, "frames": frames, "cache_key": render_key,
+                "cache_hit": None, "video_url": None}
 
     except Exception as e:
         print(f"[ERROR] Animation failed: {e}")
         raise
 
+    finally:
+        tracer = stop_trace()
+        if tracer is not None:
+            print(f"[INFO] Trace written → {tracer.save(trace_path)}")
+
+
+def deliver_silent(silent_path, out_path):
+    """Fragmented silent render → regular +faststart out_path (moved as is if the remux fails)."""
+    if faststart_copy(silent_path, out_path):
+        os.remove(silent_path)
+    else:
+        os.replace(silent_path, out_path)
+
+
+def attach_audio(render, silent_path, out_path, audio):
+    """
+    Mux the prefetched soundtrack (fetch_audio result, already AAC) into the silent render:
+    a stream copy, no re-encode. Cache levels on top of the render: audio-muxed final
+    (+ audio digest) → uploaded video_url. Without audio the silent render is only remuxed
+    to +faststart, so every delivered file has the same layout.
+    """
+    if audio is None or not os.path.exists(silent_path):
+        if os.path.exists(silent_path):
+            deliver_silent(silent_path, out_path)
+        return render
+
+    audio_path, audio_digest = audio
+    final_key = cache_key(render["cache_key"], audio_digest) if render["cache_key"] else None
+    result = {**render, "cache_key": final_key}
+    try:
+        meta = cache_get_meta(final_key) if final_key else None
+        if meta and meta.get("video_url"):
+            print(f"[INFO] Render cache hit (uploaded) → {meta['video_url']}")
+            return {**result, "cache_hit": "uploaded", "video_url": meta["video_url"]}
+        if meta and cache_fetch_file(final_key, out_path):
+            print(f"[INFO] Render cache hit (final) → {out_path}")
+            return {**result, "cache_hit": "final"}
+
+        if not mux_audio(silent_path, audio_path, out_path):
+            deliver_silent(silent_path, out_path)
+            return render
+        if final_key:
+            cache_put_file(final_key, out_path)
+            cache_put_meta(final_key, {"duration": render["duration"], "frames": render["frames"]})
+        return result
+    finally:
+        if os.path.exists(silent_path):
+            os.remove(silent_path)
+
+
+def remember_upload(key, video_url):
+    """Attach the uploaded URL to a cache entry so identical requests skip render + upload."""
+    if key is None:
+        return
+    meta = cache_get_meta(key)
+    if meta is not None:
+        meta["video_url"] = video_url
+        cache_put_meta(key, meta)
+
+
+def make_progress_reporter(job_id):
+    """Writer progress hook (runs in the worker): forwards ~100 updates per render to the API process."""
+    sent = [0]
+
+    def report(done, total):
+        step = max(1, (total or 100) // 100)
+        if done - sent[0] >= step or done == total:
+            sent[0] = done
+            progress_queue.put((job_id, done, total))
+    return report
+
+
+# ---- Render worker pool ----
+render_pool = None
+render_slots = 0  # jobs downloading, rendering or waiting in the pool queue
+renders_in_pool = 0  # renders submitted to the pool (running or waiting for a worker)
+progress_queue = None  # worker → API process frame progress
+
+
+def init_render_worker(threads, queue):
+    """Pin OpenCV threads per worker so N workers don't oversubscribe the cores."""
+    global progress_queue
+    progress_queue = queue
+    cv2.setNumThreads(threads)
+    warm_static_assets(STATIC_ASSETS)
+
+
+def start_render_pool():
+    global render_pool, progress_queue
+    threads = max(1, (os.cpu_count() or 1) // RENDER_WORKERS)
+    progress_queue = multiprocessing.Queue()
+    render_pool = ProcessPoolExecutor(
+        max_workers=RENDER_WORKERS,
+        initializer=init_render_worker,
+        initargs=(threads, progress_queue),
+    )
+    loop = asyncio.get_running_loop()
+    threading.Thread(target=drain_progress, args=(loop,), daemon=True).start()
+    print(f"[INFO] Render pool started: {RENDER_WORKERS} workers × {threads} threads, queue {RENDER_QUEUE_SIZE}")
+
+
+def drain_progress(loop):
+    """Background thread: hand worker progress messages to the event loop."""
+    while True:
+        item = progress_queue.get()
+        if item is None:
+            break
+        loop.call_soon_threadsafe(update_job_progress, *item)
 
-# ---- Main endpoint ----
-@app.get("/process")
-async def process(
-    request: Request,
-    image_url: str = Query(..., description="Public image URL"),
-    animation: str = Query("reveal_vertical_zoomout", description="Animation type"),
-    audio_url: str = Query(None, description="Optional audio URL (MP3, AAC, etc.)")
-):
-    """Download image → apply selected animation → attach audio (optional) → upload to Cloudinary."""
-    img = await fetch_image(image_url)
-    if img is None:
-        return {"error": "❌ Image download failed or invalid URL"}
 
-    out_path = os.path.join(OUTDIR, f"anim_{uuid.uuid4().hex}.mp4")
+def render_pool_full(needed=1):
+    return render_slots + needed > RENDER_WORKERS + RENDER_QUEUE_SIZE
+
+
+def busy_response():
+    """Fast 429 so clients back off instead of piling onto a saturated pool."""
+    REJECTED.inc()
+    return JSONResponse(
+        status_code=429,
+        content={"error": "⏳ Render queue is full, please retry later."},
+        headers={"Retry-After": str(RENDER_RETRY_AFTER)},
+    )
+
+
+def timed_render(*args):
+    """run_animation_sync plus when the worker picked it up and how long it took."""
+    started = time.time()
+    render = run_animation_sync(*args)
+    return {**render, "started": started, "render_seconds": time.time() - started}
+
 
-    # ✅ Run animation
+async def submit_render(image, out_path, animation, job_id=None, params=None, reuse_upload=True,
+                        trace_path=None, image_key=None):
+    """Run run_animation_sync in the process pool (image: encoded bytes, decoded by the worker)."""
+    global renders_in_pool
+    loop = asyncio.get_running_loop()
+    submitted = time.time()
+    renders_in_pool += 1
     try:
-        loop = asyncio.get_event_loop()
-        duration, frames = await loop.run_in_executor(
-            None, lambda: run_animation_sync(img, out_path, animation, audio_url)
+        render = await loop.run_in_executor(
+            render_pool, timed_render, image, out_path, animation, job_id, params, reuse_upload, trace_path, image_key
         )
-    except Exception as e:
-        return {"error": f"❌ Animation processing failed: {str(e)}"}
+    finally:
+        renders_in_pool -= 1
+
+    label = animation_label(animation)
+    STAGE_SECONDS.observe(max(0.0, render["started"] - submitted), stage="queue", animation=label)
+    STAGE_SECONDS.observe(render["render_seconds"], stage="render", animation=label)
+    WORKER_BUSY.inc(render["render_seconds"])
+    if render["cache_hit"] is None:
+        FRAMES_RENDERED.inc(render["frames"], animation=label)
+        RENDER_FPS.observe(render["frames"] / max(render["render_seconds"], 1e-6), animation=label)
+    return render
+
+
+# ---- Job store ----
+JOBS = {}
+JOB_TTL = int(os.getenv("JOB_TTL", "3600"))  # seconds a finished job stays queryable
+JOB_FINISHED = ("done", "failed")
 
-    # ✅ Wait for output
-    timeout = 30
-    for _ in range(timeout):
-        if os.path.exists(out_path) and os.path.getsize(out_path) > 5000:
-            break
-        await asyncio.sleep(1)
 
-    if not os.path.exists(out_path):
-        return {"error": "⚠️ Video generation failed or file missing."}
+def job_view(job):
+    """Public (JSON-safe) part of a job record."""
+    return {k: v for k, v in job.items() if k not in ("changed", "task", "render_path")}
 
-    # ✅ Upload to Cloudinary directly
-    cloudinary_url = upload_to_cloudinary(out_path)
 
-    if not cloudinary_url:
-        return {"error": "❌ Failed to upload video to Cloudinary."}
+def touch_job(job, **fields):
+    """Update a job and wake every SSE listener waiting on it."""
+    job.update(fields, updated=time.time())
+    job["changed"].set()
+    job["changed"] = asyncio.Event()
 
-    # ✅ Cleanup local file after upload
+
+def update_job_progress(job_id, done, total):
+    job = JOBS.get(job_id)
+    if job is not None and job["status"] not in JOB_FINISHED:
+        touch_job(job, frames_done=done, frames_total=total)
+
+
+def prune_jobs():
+    cutoff = time.time() - JOB_TTL
+    for job_id in [k for k, j in JOBS.items() if j["status"] in JOB_FINISHED and j["updated"] < cutoff]:
+        del JOBS[job_id]
+
+
+def create_job(image_url, animation, audio_url=None, params=None, trace=False, **shared):
+    """
+    Register a job, claim an admission slot and start it in the background.
+    shared: image_task / audio_task already fetching for several jobs (see /batch).
+    """
+    global render_slots
+    prune_jobs()
+    render_slots += 1  # released by run_job_stages once the render is over
+    now = time.time()
+    job = {
+        "id": uuid.uuid4().hex,
+        "status": "queued",
+        "animation": animation,
+        "image_url": image_url,
+        "audio_url": audio_url,
+        "params": params or {},
+        "frames_done": 0,
+        "frames_total": None,
+        "result": None,
+        "error": None,
+        "render_path": None,
+        "trace": trace or TRACE_RENDERS,
+        "created": now,
+        "updated": now,
+        "changed": asyncio.Event(),
+    }
+    JOBS[job["id"]] = job
+    job["task"] = asyncio.create_task(run_job(job, **shared))
+    job["task"].add_done_callback(lambda _: JOB_SECONDS.observe(
+        time.time() - job["created"], animation=animation_label(animation), status=job["status"]
+    ))
+    return job
+
+
+def timed_fetch_audio(audio_url, label):
+    t = time.time()
+    audio = fetch_audio(audio_url)
+    STAGE_SECONDS.observe(time.time() - t, stage="audio", animation=label)
+    return audio
+
+
+async def run_job(job, **shared):
+    """Run the job's stages; any unexpected error fails the job, so every job ends in JOB_FINISHED."""
     try:
-        os.remove(out_path)
-        print(f"[INFO] Local file deleted after upload.")
-    except Exception:
-        pass
+        await run_job_stages(job, **shared)
+    except Exception as e:
+        print(f"[ERROR] Job {job['id']} failed: {e}")
+        touch_job(job, status="failed", error=f"❌ Job failed: {str(e)}")
+
+
+async def run_job_stages(job, image_task=None, audio_task=None):
+    """
+    Download image → render (process pool) → mux audio → upload to Cloudinary, updating the job as it goes.
+    The soundtrack is fetched (audio cache, see fetch_audio) in a thread alongside the image
+    download and the render, so the mux afterwards is a stream copy. A batch passes shared
+    image_task / audio_task instead, so those are fetched once for all of its variants.
+    """
+    global render_slots
+    animation, audio_url = job["animation"], job["audio_url"]
+    out_path = os.path.join(OUTDIR, f"anim_{job['id']}.mp4")
+    label = animation_label(animation)
+    if audio_task is None and audio_url:
+        audio_task = asyncio.create_task(asyncio.to_thread(timed_fetch_audio, audio_url, label))
+    render_path = out_path.replace(".mp4", "_silent.mp4")  # fragmented, see attach_audio
+    job["render_path"] = render_path
 
-    # ✅ Response (Public Cloudinary URL)
+    try:
+        touch_job(job, status="downloading")
+        t = time.time()
+        image_key = None
+        if image_task is not None:
+            prepared = await image_task
+            image = batch_input(prepared, animation, job["params"]) if prepared else None
+            image_key = prepared and prepared["key"]
+        else:
+            image = await fetch_image(job["image_url"])
+        STAGE_SECONDS.observe(time.time() - t, stage="download", animation=label)
+        if image is None:
+            touch_job(job, status="failed", error="❌ Image download failed or invalid URL")
+            return
+
+        # ✅ Run animation (process pool, bounded admission)
+        touch_job(job, status="rendering")
+        try:
+            trace_path = os.path.join(TRACE_DIR, f"{job['id']}.json") if job["trace"] else None
+            render = await submit_render(image, render_path, animation, job["id"], job["params"],
+                                         reuse_upload=audio_task is None, trace_path=trace_path,
+                                         image_key=image_key)
+        except Exception as e:
+            touch_job(job, status="failed", error=f"❌ Animation processing failed: {str(e)}")
+            return
+    finally:
+        render_slots -= 1
+
+    # ✅ Attach the prefetched soundtrack (stream copy; without one, just remux to faststart)
+    audio = None
+    if audio_task is not None:
+        audio = await audio_task
+        if audio is None:
+            print(f"[WARN] Audio unavailable, delivering without it: {audio_url}")
+    t = time.time()
+    render = await asyncio.to_thread(attach_audio, render, render_path, out_path, audio)
+    STAGE_SECONDS.observe(time.time() - t, stage="mux", animation=label)
+    RENDER_CACHE.inc(result=render["cache_hit"] or ("miss" if render["cache_key"] else "disabled"))
+
+    cloudinary_url = render["video_url"]
+    if cloudinary_url is None:
+        # ✅ The worker returns once ffmpeg has finished the file
+        if not os.path.exists(out_path):
+            touch_job(job, status="failed", error="⚠️ Video generation failed or file missing.")
+            return
+
+        # ✅ Upload (async, pooled connection, retried)
+        touch_job(job, status="uploading")
+        t = time.time()
+        cloudinary_url = await upload_video(out_path)
+        STAGE_SECONDS.observe(time.time() - t, stage="upload", animation=label)
+
+        if not cloudinary_url:
+            touch_job(job, status="failed", error="❌ Failed to upload video to Cloudinary.")
+            return
+        remember_upload(render["cache_key"], cloudinary_url)
+
+        # ✅ Cleanup local file after upload
+        try:
+            os.remove(out_path)
+            print(f"[INFO] Local file deleted after upload.")
+        except Exception:
+            pass
+
+    # ✅ Result (Public Cloudinary URL)
     print(f"[SUCCESS] Final Cloudinary URL: {cloudinary_url}")
 
-    return {
+    touch_job(job, status="done", result={
         "status": "✅ Success",
         "animation": animation,
-        "audio_attached": bool(audio_url),
-        "duration_seconds": duration,
-        "frames_written": frames,
+        "audio_attached": audio is not None,
+        "duration_seconds": render["duration"],
+        "frames_written": render["frames"],
+        "cache_hit": render["cache_hit"],
         "video_url": cloudinary_url,  # 🔹 Public Cloudinary URL
+        "trace_url": f"/outputs/traces/{job['id']}.json" if job["trace"] else None,
+    })
+
+
+# ---- Job endpoints ----
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    image_url: str = Query(..., description="Public image URL"),
+    animation: str = Query("reveal_vertical_zoomout", description="Animation type"),
+    audio_url: str = Query(None, description="Optional audio URL (MP3, AAC, etc.)"),
+    cartoon_quality: str = Query(None, description="image_to_cartoon5 speed/quality: fast, balanced, best"),
+    quality: str = Query("full", description="Render quality: full, or draft for a fast low-res preview"),
+    profile: str = Query(DEFAULT_OUTPUT_PROFILE, description="Output profile: 1080p, 720p, 540p, 720p_short"),
+    trace: bool = Query(False, description="Record a Chrome/Perfetto trace of the render (forces a fresh render)")
+):
+    """Queue a render and return immediately with the job id."""
+    params = request_params([animation], cartoon_quality, quality, profile, audio_url)
+    if isinstance(params, JSONResponse):
+        return params
+    if render_pool_full():
+        return busy_response()
+
+    job = create_job(image_url, animation, audio_url, params[animation], trace)
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "status_url": f"/jobs/{job['id']}",
+        "events_url": f"/jobs/{job['id']}/events",
+        "video_stream_url": f"/jobs/{job['id']}/video",
+    }
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "❌ Unknown job id"})
+    return job_view(job)
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events: one event per status change / progress update until the job finishes."""
+    job = JOBS.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "❌ Unknown job id"})
+
+    async def stream():
+        while True:
+            changed = job["changed"]
+            yield f"event: {job['status']}\ndata: {json.dumps(job_view(job))}\n\n"
+            if job["status"] in JOB_FINISHED:
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=15)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ---- Live video stream ----
+STREAM_CHUNK = 256 * 1024
+
+
+async def tail_render(job, f):
+    """Chunked body: follow the fragmented MP4 while the worker is still encoding it."""
+    with f:
+        while True:
+            changed = job["changed"]
+            rendering = job["status"] == "rendering"
+            chunk = await asyncio.to_thread(f.read, STREAM_CHUNK)
+            if chunk:
+                yield chunk
+            elif not rendering:
+                return  # render over and the file read to the end
+            else:
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    pass
+
+
+async def video_response(job):
+    """
+    Stream the job's render as it is encoded (silent; the soundtrack is muxed into the
+    uploaded file). Once the render is over, wait for the job and redirect to the upload.
+    """
+    while True:
+        if job["status"] == "done":
+            return RedirectResponse(job["result"]["video_url"])
+        if job["status"] == "failed":
+            return JSONResponse(status_code=500, content={"error": job["error"]})
+        changed = job["changed"]
+        if job["status"] == "rendering":
+            try:
+                f = open(job["render_path"], "rb")  # held open, so cleanup can't cut the stream
+                break
+            except FileNotFoundError:
+                pass  # worker hasn't started writing yet
+        try:
+            await asyncio.wait_for(changed.wait(), timeout=0.5)
+        except asyncio.TimeoutError:
+            pass
+
+    return StreamingResponse(
+        tail_render(job, f),
+        media_type="video/mp4",
+        headers={"Cache-Control": "no-cache", "X-Job-Id": job["id"]},
+    )
+
+
+@app.get("/jobs/{job_id}/video")
+async def job_video(job_id: str):
+    """Fragmented MP4 streamed while rendering; redirects to the uploaded video once done."""
+    job = JOBS.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "❌ Unknown job id"})
+    return await video_response(job)
+
+
+# ---- Main endpoint ----
+@app.get("/process")
+async def process(
+    request: Request,
+    image_url: str = Query(..., description="Public image URL"),
+    animation: str = Query("reveal_vertical_zoomout", description="Animation type"),
+    audio_url: str = Query(None, description="Optional audio URL (MP3, AAC, etc.)"),
+    cartoon_quality: str = Query(None, description="image_to_cartoon5 speed/quality: fast, balanced, best"),
+    quality: str = Query("full", description="Render quality: full, or draft for a fast low-res preview"),
+    profile: str = Query(DEFAULT_OUTPUT_PROFILE, description="Output profile: 1080p, 720p, 540p, 720p_short"),
+    stream: bool = Query(False, description="Stream the video while it renders instead of waiting for the upload"),
+    trace: bool = Query(False, description="Record a Chrome/Perfetto trace of the render (forces a fresh render)")
+):
+    """
+    Blocking wrapper over the job API: submit a job and wait for its result.
+    stream=true answers with the video itself as soon as the first fragment is encoded
+    (the upload still completes in the background; X-Job-Id names the job).
+    """
+    params = request_params([animation], cartoon_quality, quality, profile, audio_url)
+    if isinstance(params, JSONResponse):
+        return params
+    if render_pool_full():
+        return busy_response()
+
+    job = create_job(image_url, animation, audio_url, params[animation], trace)
+    if stream:
+        return await video_response(job)
+    await asyncio.shield(job["task"])
+
+    if job["status"] != "done":
+        return {"error": job["error"]}
+    return job["result"]
+
+
+# ---- Batch endpoint ----
+@app.get("/batch")
+async def batch(
+    image_url: list[str] = Query(..., description="Public image URL (repeat for several images)"),
+    animation: list[str] = Query(..., description="Animation type (repeat for several styles)"),
+    audio_url: str = Query(None, description="Optional audio URL (MP3, AAC, etc.), shared by every variant"),
+    cartoon_quality: str = Query(None, description="image_to_cartoon5 speed/quality: fast, balanced, best"),
+    quality: str = Query("full", description="Render quality: full, or draft for a fast low-res preview"),
+    profile: str = Query(DEFAULT_OUTPUT_PROFILE, description="Output profile: 1080p, 720p, 540p, 720p_short"),
+    trace: bool = Query(False, description="Record a Chrome/Perfetto trace of every render (forces fresh renders)")
+):
+    """
+    Every image × every animation in one call. Each image is downloaded, decoded, hashed and
+    resized to the canvas once, and the soundtrack fetched once; the variants are ordinary jobs
+    (pollable under /jobs/{job_id}) rendering in parallel on the pool. Waits for all and
+    returns every result.
+    """
+    images, animations = list(dict.fromkeys(image_url)), list(dict.fromkeys(animation))
+    params = request_params(animations, cartoon_quality, quality, profile, audio_url)
+    if isinstance(params, JSONResponse):
+        return params
+    variants = len(images) * len(animations)
+    limit = min(BATCH_MAX_VARIANTS, RENDER_WORKERS + RENDER_QUEUE_SIZE)
+    if variants > limit:
+        return JSONResponse(
+            status_code=400,
+            content={"error": f"❌ Too many variants: {variants} (at most {limit} images × animations per batch)"},
+        )
+    if render_pool_full(variants):
+        return busy_response()
+
+    audio_task = asyncio.create_task(asyncio.to_thread(timed_fetch_audio, audio_url, "batch")) if audio_url else None
+    scales = {params[name].get("scale", 1.0) for name in animations if name in CANVAS_INPUT_ANIMATIONS}
+    jobs = []
+    for url in images:
+        image_task = asyncio.create_task(fetch_prepared_image(url, scales))
+        for name in animations:
+            jobs.append(create_job(url, name, audio_url, params[name], trace, image_task=image_task, audio_task=audio_task))
+    started = time.time()
+    await asyncio.gather(*(asyncio.shield(job["task"]) for job in jobs))
+
+    results = [
+        {"job_id": job["id"], "image_url": job["image_url"], "animation": job["animation"],
+         **(job["result"] if job["status"] == "done" else {"error": job["error"]})}
+        for job in jobs
+    ]
+    done = sum(job["status"] == "done" for job in jobs)
+    return {
+        "status": "✅ Success" if done == len(jobs) else f"⚠️ {done}/{len(jobs)} variants succeeded",
+        "variants": len(jobs),
+        "elapsed_seconds": round(time.time() - started, 3),
+        "results": results,
     }
 
 
+# ---- Metrics ----
+def jobs_by_status():
+    counts = {}
+    for job in JOBS.values():
+        counts[(job["status"],)] = counts.get((job["status"],), 0) + 1
+    return counts
+
+
+Gauge("anim_jobs", "Known jobs by status.", ("status",), fn=jobs_by_status)
+Gauge("anim_jobs_in_flight", "Jobs admitted and not yet finished.",
+      fn=lambda: {(): sum(j["status"] not in JOB_FINISHED for j in JOBS.values())})
+Gauge("anim_render_queue_depth", "Renders waiting for a free worker.",
+      fn=lambda: {(): max(0, renders_in_pool - RENDER_WORKERS)})
+Gauge("anim_render_workers", "Render worker processes.", fn=lambda: {(): RENDER_WORKERS})
+Gauge("anim_render_worker_utilization", "Busy render workers / workers, right now.",
+      fn=lambda: {(): min(renders_in_pool, RENDER_WORKERS) / RENDER_WORKERS})
+Gauge("anim_admission_slots_used", "Admitted jobs still downloading or rendering (429 at workers + queue size).",
+      fn=lambda: {(): render_slots})
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint: stage latencies, throughput, queue depth, utilization, cache hits."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 # ---- Startup Event ----
 @app.on_event("startup")
 async def startup_event():
     print("🚀 Initializing Animation API...")
     await asyncio.sleep(3)
+    await asyncio.to_thread(warm_static_assets, STATIC_ASSETS)
+    get_http_session()
+    start_render_pool()
     print("✅ Ready to process requests.")
 
 
+# ---- Shutdown Event ----
+@app.on_event("shutdown")
+async def shutdown_event():
+    if render_pool is not None:
+        render_pool.shutdown(wait=False, cancel_futures=True)
+    if progress_queue is not None:
+        progress_queue.put(None)
+    if http_session is not None:
+        await http_session.close()
+
+
 # ---- Run locally ----
 if __name__ == "__main__":
     uvicorn.run("app:app", host="0.0.0.0", port=10000, reload=False)
@@ -0,0 +1,296 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+try:
+    import resource  # POSIX only; peak RSS is reported as null elsewhere
+except ImportError:
+    resource = None
+
+# ✅ Reproducible benchmark for every animation (python benchmark.py --help)
+# Each case = one animation × one synthetic image, rendered in a fresh process so
+# peak RSS is per case. Stages (wall time, seconds):
+#   prepare   → call start until the encoder opens (resize, layers, timeline compile)
+#   composite → frame drawing (writer open → release, minus encoder waits)
+#   encode    → time the renderer spent blocked on ffmpeg (pipe writes + final flush)
+#   finalize  → work after the encoder closed (duration probe etc.)
+#   mux       → stream-copying a cached AAC track into the result (mux_audio)
+# Inputs are synthetic and seeded, the vertical_reveal background is a generated
+# stand-in in a private asset cache, so runs need no network and are comparable.
+# --baseline old.json compares against an earlier run and exits 1 on regressions.
+
+ANIMATIONS = {
+    "reveal_vertical_zoomout": ("animations.vertical_reveal", "animate_collage_tapestry"),
+    "zoomin_zoomout_fadein2": ("animations.zoomout_zoomin2", "animate_zoomin_zoomout_fadein2"),
+    "center_reveal_slide3": ("animations.center_reveal_slide3", "animate_center_reveal_slide3"),
+    "swing_r_swing_d4": ("animations.swing_r_swing_d4", "animate_swing_r_swing_d4"),
+    "image_to_cartoon5": ("animations.image_to_cartoon5", "animate_image_to_cartoon5"),
+    "zoomout_with_effect6": ("animations.zoomout_with_effect6", "animate_zoomout_with_effect6"),
+    "ultra_zoom_blur7": ("animations.ultra_zoom_blur7", "animate_ultra_zoom_blur7"),
+}
+
+# portrait phone photo, landscape, square, small, large camera shot
+DEFAULT_SIZES = ["1080x1920", "1920x1080", "1024x1024", "480x640", "3000x4000"]
+
+# (metric, direction): a change beyond the tolerance in the bad direction is a regression
+COMPARED_METRICS = [
+    ("fps", "higher"),
+    ("total_seconds", "lower"),
+    ("peak_rss_mb", "lower"),
+    ("output_bytes", "lower"),
+]
+
+
+def synthetic_image(width, height, seed=0):
+    """Smooth colour field + fine grain: photo-like enough for realistic encode cost."""
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, (6, 4, 3), dtype=np.uint8)
+    img = cv2.resize(coarse, (width, height), interpolation=cv2.INTER_CUBIC)
+    grain = rng.integers(-12, 13, (height, width, 3), dtype=np.int16)
+    return np.clip(img.astype(np.int16) + grain, 0, 255).astype(np.uint8)
+
+
+def seed_background(asset_dir):
+    """Put a generated background under BACKGROUND_URL in the benchmark's asset cache."""
+    from animations.utils import CANVAS_SIZE, _asset_paths, create_gradient_background
+    from animations.vertical_reveal import BACKGROUND_URL
+
+    data_path, meta_path = _asset_paths(BACKGROUND_URL)
+    w, h = CANVAS_SIZE
+    bg = create_gradient_background(h, w, (40, 20, 90), (200, 170, 230))
+    os.makedirs(asset_dir, exist_ok=True)
+    cv2.imwrite(data_path + ".png", bg)
+    os.replace(data_path + ".png", data_path)
+    with open(meta_path, "w") as f:
+        json.dump({"etag": None, "last_modified": None, "checked_at": 4102444800}, f)  # fresh until 2100
+
+
+def synthetic_audio(path, seconds=20):
+    """Sine tone soundtrack for the mux stage."""
+    subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error", "-f", "lavfi",
+         "-i", f"sine=frequency=440:duration={seconds}", path],
+        check=True,
+    )
+
+
+def ffmpeg_version():
+    try:
+        out = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True).stdout
+        return out.splitlines()[0] if out else None
+    except OSError:
+        return None
+
+
+def _peak_rss_mb():
+    """Peak resident memory of this process (the renderer; ffmpeg runs separately)."""
+    if resource is None:
+        return None
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        kb /= 1024  # bytes there
+    return round(kb / 1024, 1)
+
+
+def run_case(animation, width, height, params, audio_path, workdir, seed):
+    """One render in this (fresh) process; returns the raw measurements."""
+    import importlib
+    from animations import utils
+
+    stats = {"opened": None, "released": None, "encode": 0.0}
+
+    class TimedWriter(utils.FFmpegVideoWriter):
+        def __init__(self, *args, **kwargs):
+            stats["opened"] = time.perf_counter()
+            super().__init__(*args, **kwargs)
+
+        def _emit(self, *args):
+            t = time.perf_counter()
+            super()._emit(*args)
+            stats["encode"] += time.perf_counter() - t
+
+        def _finish(self):
+            if self.proc is None:
+                return super()._finish()
+            t = time.perf_counter()
+            super()._finish()
+            stats["released"] = time.perf_counter()
+            stats["encode"] += stats["released"] - t
+
+    utils.FFmpegVideoWriter = TimedWriter  # open_video_writer looks it up at call time
+
+    module, func = ANIMATIONS[animation]
+    animate = getattr(importlib.import_module(module), func)
+    img = synthetic_image(width, height, seed)
+    out_path = os.path.join(workdir, f"{animation}_{width}x{height}.mp4")
+    muxed_path = out_path.replace(".mp4", "_audio.mp4")
+
+    start = time.perf_counter()
+    duration, frames = animate(img, out_path, **params)
+    end = time.perf_counter()
+
+    audio = utils.fetch_local_audio(audio_path)
+    t = time.perf_counter()
+    if audio is None or not utils.mux_audio(out_path, audio[0], muxed_path):
+        raise RuntimeError("mux stage failed")
+    mux = time.perf_counter() - t
+
+    opened, released = stats["opened"], stats["released"] or end
+    render = end - start
+    result = {
+        "frames": frames,
+        "duration_seconds": round(duration, 3),
+        "fps": round(frames / render, 2),
+        "stages": {
+            "prepare": round(opened - start, 4),
+            "composite": round(released - opened - stats["encode"], 4),
+            "encode": round(stats["encode"], 4),
+            "finalize": round(end - released, 4),
+            "mux": round(mux, 4),
+        },
+        "total_seconds": round(render + mux, 4),
+        "peak_rss_mb": _peak_rss_mb(),
+        "output_bytes": os.path.getsize(muxed_path),
+    }
+    os.remove(out_path)
+    os.remove(muxed_path)
+    return result
+
+
+def run_isolated(*args):
+    """run_case in a new interpreter (spawn), so peak RSS belongs to this case only."""
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        return pool.submit(run_case, *args).result()
+
+
+def summarize(runs):
+    """Median of the timing fields over repeats, max of the peak RSS."""
+    first = runs[0]
+    values = [r["peak_rss_mb"] for r in runs if r["peak_rss_mb"] is not None]
+
+    return {
+        "frames": first["frames"],
+        "duration_seconds": first["duration_seconds"],
+        "fps": round(statistics.median(r["fps"] for r in runs), 2),
+        "stages": {
+            name: round(statistics.median(r["stages"][name] for r in runs), 4)
+            for name in first["stages"]
+        },
+        "total_seconds": round(statistics.median(r["total_seconds"] for r in runs), 4),
+        "peak_rss_mb": max(values) if values else None,
+        "output_bytes": first["output_bytes"],
+        "repeats": len(runs),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of results against a baseline run: list of human-readable lines."""
+    old = {(r["animation"], r["image"]): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        base = old.get((r["animation"], r["image"]))
+        if base is None:
+            print(f"[WARN] No baseline for {r['animation']} @ {r['image']}")
+            continue
+        for metric, better in COMPARED_METRICS:
+            new_v, old_v = r.get(metric), base.get(metric)
+            if not new_v or not old_v:
+                continue
+            change = (new_v - old_v) / old_v
+            worse = change < -tolerance if better == "higher" else change > tolerance
+            line = f"{r['animation']} @ {r['image']}: {metric} {old_v} → {new_v} ({change:+.1%})"
+            if worse:
+                regressions.append(line)
+                print(f"[FAIL] {line}")
+            elif abs(change) > tolerance:
+                print(f"[INFO] improved: {line}")
+    return regressions
+
+
+def parse_size(text):
+    w, h = text.lower().split("x")
+    return int(w), int(h)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every animation on synthetic images.")
+    parser.add_argument("--animations", nargs="+", default=list(ANIMATIONS), choices=list(ANIMATIONS))
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, help="input image sizes, WxH")
+    parser.add_argument("--params", default="{}", help='animate_* kwargs as JSON, e.g. \'{"scale": 0.5, "fps": 24}\'')
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case (median timings, max memory)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", "-o", default="benchmark.json", help="results file (JSON)")
+    parser.add_argument("--baseline", help="earlier results file; exit 1 if any case regressed")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative change vs baseline")
+    args = parser.parse_args(argv)
+    params = json.loads(args.params)
+
+    workdir = tempfile.mkdtemp(prefix="anim-bench-")
+    os.environ["ASSET_CACHE_DIR"] = os.path.join(workdir, "assets")  # inherited by the case processes
+    try:
+        seed_background(os.environ["ASSET_CACHE_DIR"])
+        audio_path = os.path.join(workdir, "tone.wav")
+        synthetic_audio(audio_path)
+
+        results = []
+        for animation in args.animations:
+            for size in args.sizes:
+                width, height = parse_size(size)
+                runs = [
+                    run_isolated(animation, width, height, params, audio_path, workdir, args.seed)
+                    for _ in range(args.repeat)
+                ]
+                r = {"animation": animation, "image": f"{width}x{height}", **summarize(runs)}
+                results.append(r)
+                s = r["stages"]
+                print(f"[INFO] {animation:<24} {r['image']:>9}  {r['fps']:7.1f} fps  "
+                      f"prepare {s['prepare']:.2f}s  composite {s['composite']:.2f}s  "
+                      f"encode {s['encode']:.2f}s  mux {s['mux']:.2f}s  "
+                      f"rss {r['peak_rss_mb']} MB  {r['output_bytes'] / 1e6:.2f} MB")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "ffmpeg": ffmpeg_version(),
+            "params": params,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[INFO] Results written → {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"[ERROR] {len(regressions)} regression(s) beyond {args.tolerance:.0%} vs {args.baseline}")
+            return 1
+        print(f"[INFO] No regressions beyond {args.tolerance:.0%} vs {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
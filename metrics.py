@@ -0,0 +1,110 @@
+import threading
+
+# ✅ Minimal Prometheus metrics (text exposition format 0.0.4, no client library)
+# Counters, gauges and histograms with labels, rendered by render_metrics() for
+# GET /metrics. Everything lives in the API process; render workers report their
+# timings back in the run_animation_sync result.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+FPS_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 250, 500)
+
+_registry = []
+_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _num(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labels)
+        self.values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name}{labels} {_num(value)}" for name, labels, value in self.samples()]
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        values = self.values or ({(): 0} if not self.labelnames else {})  # unlabelled: expose 0 from the start
+        return [(self.name, _label_text(self.labelnames, k), v) for k, v in sorted(values.items())]
+
+
+class Gauge(_Metric):
+    """Set explicitly, or computed at scrape time from fn(), which returns {label values: value}."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), fn=None):
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def set(self, value, **labels):
+        with _lock:
+            self.values[self._key(labels)] = value
+
+    def samples(self):
+        values = self.fn() if self.fn is not None else self.values
+        return [(self.name, _label_text(self.labelnames, k), v) for k, v in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.values[key] = (counts, total + value)
+
+    def samples(self):
+        out = []
+        for key, (counts, total) in sorted(self.values.items()):
+            for bound, count in zip(self.buckets, counts):
+                out.append((f"{self.name}_bucket", _label_text(self.labelnames, key, [("le", _num(bound))]), count))
+            out.append((f"{self.name}_sum", _label_text(self.labelnames, key), total))
+            out.append((f"{self.name}_count", _label_text(self.labelnames, key), counts[-1]))
+        return out
+
+
+def render_metrics():
+    """All registered metrics in Prometheus text format."""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+# ✅ Content-addressed render cache (shared on disk by all render workers)
+#   <key>.mp4  → rendered video (silent render or audio-muxed final)
+#   <key>.json → metadata (duration, frames, uploaded video_url)
+# Least-recently-used entries are evicted once the directory exceeds the budget.
+CACHE_DIR = os.getenv("RENDER_CACHE_DIR", os.path.join("cache", "renders"))
+CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+CACHE_VERSION = 8  # bump when animation output changes so old entries stop matching
+
+
+def cache_enabled():
+    return CACHE_MAX_BYTES > 0
+
+
+def image_digest(img):
+    """Hash of the decoded pixels (shape + bytes), independent of the source file format."""
+    h = hashlib.sha256()
+    h.update(repr((img.shape, str(img.dtype))).encode())
+    h.update(img.tobytes())
+    return h.hexdigest()
+
+
+def cache_key(*parts):
+    """Stable key for any JSON-serialisable parts (digests, animation name, params)."""
+    raw = json.dumps([CACHE_VERSION, *parts], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _entry_path(key, suffix):
+    return os.path.join(CACHE_DIR, key + suffix)
+
+
+def _touch(path):
+    """Mark an entry as recently used (mtime drives LRU eviction)."""
+    try:
+        os.utime(path)
+        return True
+    except OSError:
+        return False
+
+
+def cache_get_file(key, suffix=".mp4"):
+    """Return the cached file path for key, or None."""
+    if not cache_enabled():
+        return None
+    path = _entry_path(key, suffix)
+    return path if _touch(path) else None
+
+
+def cache_fetch_file(key, dest_path, suffix=".mp4"):
+    """Copy a cached file to dest_path. Returns True on a hit."""
+    path = cache_get_file(key, suffix)
+    if path is None:
+        return False
+    try:
+        shutil.copyfile(path, dest_path)
+        return True
+    except OSError:
+        return False  # evicted by another worker in between
+
+
+def cache_put_file(key, src_path, suffix=".mp4"):
+    """Copy src_path into the cache atomically, then enforce the size budget."""
+    if not cache_enabled():
+        return None
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _entry_path(key, suffix)
+    fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    os.close(fd)
+    try:
+        shutil.copyfile(src_path, tmp)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"[WARN] Render cache write failed: {e}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return None
+    evict()
+    return path
+
+
+def cache_get_meta(key):
+    path = cache_get_file(key, ".json")
+    if path is None:
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def cache_put_meta(key, meta):
+    if not cache_enabled():
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, _entry_path(key, ".json"))
+
+
+def evict():
+    """Drop least-recently-used entries until the cache fits CACHE_MAX_BYTES."""
+    entries, total = [], 0
+    try:
+        with os.scandir(CACHE_DIR) as it:
+            for e in it:
+                if e.is_file() and not e.name.endswith(".tmp"):
+                    st = e.stat()
+                    entries.append((st.st_mtime, st.st_size, e.path))
+                    total += st.st_size
+    except OSError:
+        return
+    if total <= CACHE_MAX_BYTES:
+        return
+    for _, size, path in sorted(entries):
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+        if total <= CACHE_MAX_BYTES:
+            break
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import uuid
+from contextlib import nullcontext
+
+import aiohttp
+
+# ✅ Video storage backends (STORAGE_BACKEND)
+#   cloudinary → unsigned Cloudinary video upload (default)
+#   http       → any endpoint taking the same multipart POST and answering
+#                {"secure_url" | "url": ...}; a local stand-in for tests and benchmarks
+# Uploads stream the file from disk on the app's pooled aiohttp session. Files above
+# UPLOAD_CHUNK_BYTES go up in chunks (X-Unique-Upload-Id + Content-Range), and each
+# request is retried with exponential backoff on network errors, 429 and 5xx, so a
+# failure late in a large upload only resends one chunk.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "cloudinary")
+STORAGE_URL = os.getenv("STORAGE_URL", "http://127.0.0.1:9000/upload")
+CLOUDINARY_CLOUD_NAME = os.getenv("CLOUDINARY_CLOUD_NAME", "dvsubaggj")
+CLOUDINARY_UPLOAD_PRESET = os.getenv("CLOUDINARY_UPLOAD_PRESET", "flutter_unsigned_upload")
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(20 * 1024 * 1024)))  # Cloudinary minimum: 5 MiB
+UPLOAD_RETRIES = int(os.getenv("UPLOAD_RETRIES", "3"))
+UPLOAD_TIMEOUT = int(os.getenv("UPLOAD_TIMEOUT", "120"))  # seconds per request
+
+
+class UploadError(RuntimeError):
+    pass
+
+
+class HTTPStorage:
+    """Multipart POST upload of a local file; returns the public URL from the JSON reply."""
+
+    name = "http"
+
+    def __init__(self, url, fields=None, chunk_size=UPLOAD_CHUNK_BYTES, retries=UPLOAD_RETRIES,
+                 timeout=UPLOAD_TIMEOUT):
+        self.url = url
+        self.fields = fields or {}
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+
+    def _form(self, body, filename):
+        form = aiohttp.FormData()
+        for key, value in self.fields.items():
+            form.add_field(key, value)
+        form.add_field("file", body, filename=filename, content_type="video/mp4")
+        return form
+
+    async def _post(self, session, filename, data=None, path=None, headers=None):
+        """
+        POST with bounded retries; returns the decoded JSON reply.
+        The body is data (bytes) or the file at path, opened per attempt and always closed.
+        """
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+            try:
+                with open(path, "rb") if path else nullcontext(data) as body:
+                    form = self._form(body, filename)
+                    async with session.post(self.url, data=form, headers=headers, timeout=self.timeout) as resp:
+                        result = await resp.json(content_type=None)
+                        if resp.status == 200:
+                            return result
+                        error = f"HTTP {resp.status}: {result}"
+                        if resp.status != 429 and resp.status < 500:
+                            break  # rejected, retrying won't help
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                error = repr(e)
+            print(f"[WARN] Upload attempt {attempt + 1}/{self.retries + 1} failed → {error}")
+        raise UploadError(f"{self.name} upload failed: {error}")
+
+    async def upload(self, session, local_path):
+        filename = os.path.basename(local_path)
+        size = os.path.getsize(local_path)
+
+        if size <= self.chunk_size:
+            # file object → aiohttp streams it from disk (reopened on every attempt)
+            result = await self._post(session, filename, path=local_path)
+        else:
+            upload_id = uuid.uuid4().hex
+            with open(local_path, "rb") as f:
+                for start in range(0, size, self.chunk_size):
+                    chunk = await asyncio.to_thread(f.read, self.chunk_size)
+                    headers = {
+                        "X-Unique-Upload-Id": upload_id,
+                        "Content-Range": f"bytes {start}-{start + len(chunk) - 1}/{size}",
+                    }
+                    result = await self._post(session, filename, data=chunk, headers=headers)
+
+        url = result.get("secure_url") or result.get("url")
+        if not url:
+            raise UploadError(f"{self.name} upload returned no URL: {result}")
+        return url
+
+
+class CloudinaryStorage(HTTPStorage):
+    """Unsigned Cloudinary video upload (upload preset)."""
+
+    name = "cloudinary"
+
+    def __init__(self, cloud_name=CLOUDINARY_CLOUD_NAME, upload_preset=CLOUDINARY_UPLOAD_PRESET, **opts):
+        super().__init__(
+            f"https://api.cloudinary.com/v1_1/{cloud_name}/video/upload",
+            fields={"upload_preset": upload_preset},
+            **opts,
+        )
+
+
+STORAGE_BACKENDS = {
+    "cloudinary": lambda: CloudinaryStorage(),
+    "http": lambda: HTTPStorage(STORAGE_URL),
+}
+
+
+def storage_from_env():
+    if STORAGE_BACKEND not in STORAGE_BACKENDS:
+        raise ValueError(f"Invalid STORAGE_BACKEND: {STORAGE_BACKEND} (choose from {', '.join(STORAGE_BACKENDS)})")
+    return STORAGE_BACKENDS[STORAGE_BACKEND]()